@@ -1,5 +1,9 @@
 from dotenv import load_dotenv
 import os
+import json
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from langgraph.graph import StateGraph, END, START
 from typing import  TypedDict, Annotated, Sequence
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
@@ -10,6 +14,9 @@ from langchain_community.document_loaders import  PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import  Chroma
 from langchain_core.tools import tool
+from EmbeddingCache import SQLiteEmbeddingCache
+from ContextPacker import pack_context
+from MMR import mmr_by_query, stored_embeddings
 
 load_dotenv()
 
@@ -18,9 +25,15 @@ model = ChatGroq(
     temperature=0
 )
 
-embedding=HuggingFaceEndpointEmbeddings(
-    model="BAAI/bge-large-en-v1.5",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACE_API_TOKEN")
+embedding_model_name = "BAAI/bge-large-en-v1.5"
+
+embedding = SQLiteEmbeddingCache(
+    HuggingFaceEndpointEmbeddings(
+        model=embedding_model_name,
+        huggingfacehub_api_token=os.getenv("HUGGINGFACE_API_TOKEN")
+    ),
+    model_name=embedding_model_name,
+    path="embedding_cache.db",
 )
 
 pdf_path = "Report.pdf"
@@ -28,34 +41,81 @@ pdf_path = "Report.pdf"
 if not os.path.exists(pdf_path):
     raise FileNotFoundError(f"PDF file not found at {pdf_path}")
 
-loader = PyPDFLoader(pdf_path)
-
-documents = loader.load()
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200,
-)
-
-chunks = text_splitter.split_documents(documents)
+chunk_size = 1000
+chunk_overlap = 200
+context_token_budget = 1500
 
 db_path = "./chroma_db"
 collection_name = "report"
+manifest_path = os.path.join(db_path, f"{collection_name}_manifest.json")
 
 if not os.path.exists(db_path):
     os.makedirs(db_path)
 
-vector_store = Chroma.from_documents(
-    documents=chunks,
-    embedding=embedding,
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Everything that changes the contents of the collection. If it matches what
+# was recorded when the collection was built, the persisted index is reused.
+manifest = {
+    "source_sha256": file_sha256(pdf_path),
+    "chunk_size": chunk_size,
+    "chunk_overlap": chunk_overlap,
+    "add_start_index": True,
+    "embedding_model": embedding_model_name,
+}
+
+def load_manifest() -> dict:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+vector_store = Chroma(
     persist_directory=db_path,
-    collection_name=collection_name
+    collection_name=collection_name,
+    embedding_function=embedding,
 )
 
-retriever = vector_store.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 5}
-)
+if load_manifest() == manifest and vector_store._collection.count() > 0:
+    print("Using existing index for Report.pdf")
+else:
+    print("Indexing Report.pdf...")
+    # Start from an empty collection so a rebuild replaces the old chunks
+    # instead of adding a second copy of them. The manifest is dropped first so
+    # an interrupted rebuild is never mistaken for a complete index.
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    vector_store.reset_collection()
+
+    loader = PyPDFLoader(pdf_path)
+
+    documents = loader.load()
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True,
+    )
+
+    chunks = text_splitter.split_documents(documents)
+
+    vector_store.add_documents(chunks)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+# The fetch_k nearest chunks are re-ranked by maximal marginal relevance over
+# their stored embeddings and retriever_k are kept, so one call covers more of
+# the report instead of several near-identical chunks of one paragraph.
+retriever_k = 5
+retriever_fetch_k = 20
+retriever_lambda_mult = 0.5
 
 @tool
 def retriever_tool(query: str) -> str:
@@ -66,10 +126,22 @@ def retriever_tool(query: str) -> str:
         Returns:
             str: The content of the document that matches the query.
     """
-    results = retriever.invoke(query)
+    query_embedding = embedding.embed_query(query)
+    results = vector_store.similarity_search_by_vector(query_embedding, k=retriever_fetch_k)
+    if len(results) > retriever_k:
+        picked = mmr_by_query(
+            query_embedding,
+            stored_embeddings(vector_store, [doc.id for doc in results]),
+            retriever_k,
+            retriever_lambda_mult,
+        )
+        results = [results[index] for index in picked]
     if not results:
         return "No relevant information found in the document."
-    return "\n".join([doc.page_content + "\n\n" for doc in results])
+    # Neighbouring chunks share chunk_overlap characters; merge them so the
+    # shared text is only sent to the model once.
+    packed = pack_context(results, max_tokens=context_token_budget)
+    return "\n".join([doc.page_content + "\n\n" for doc in packed])
 
 tools = [retriever_tool]
 
@@ -99,25 +171,59 @@ def call_llm(state: AgentState) -> AgentState:
     message = model_tools.invoke(messages)
     return {'messages': [message]}
 
+tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+tool_timeout_seconds = 30
+
+def run_tool(t) -> str:
+    print(f"Calling Tool: {t['name']} with query: {t['args'].get('query', 'No query provided')}")
+
+    if not t['name'] in tools_dict: # Checks if a valid tool is present
+        print(f"\nTool: {t['name']} does not exist.")
+        return "Incorrect Tool Name, Please Retry and Select tool from List of Available tools."
+
+    result = tools_dict[t['name']].invoke(t['args'].get('query', ''))
+    print(f"Result length: {len(str(result))}")
+    return str(result)
+
 def take_action(state: AgentState) -> AgentState:
-    """Execute tool calls from the LLM's response."""
+    """Execute tool calls from the LLM's response concurrently, keeping their order."""
 
     tool_calls = state['messages'][-1].tool_calls
-    results = []
-    for t in tool_calls:
-        print(f"Calling Tool: {t['name']} with query: {t['args'].get('query', 'No query provided')}")
-        
-        if not t['name'] in tools_dict: # Checks if a valid tool is present
-            print(f"\nTool: {t['name']} does not exist.")
-            result = "Incorrect Tool Name, Please Retry and Select tool from List of Available tools."
-        
-        else:
-            result = tools_dict[t['name']].invoke(t['args'].get('query', ''))
-            print(f"Result length: {len(str(result))}")
-            
-
-        # Appends the Tool Message
-        results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
+    started = {}
+
+    def timed_run(index, t):
+        # Calls may queue for a free worker; each one's timeout starts here.
+        started[index] = time.monotonic()
+        return run_tool(t)
+
+    pending = {tool_executor.submit(timed_run, index, t): index for index, t in enumerate(tool_calls)}
+    contents = {}
+    # A queued call times out too if no worker frees up for tool_timeout_seconds.
+    idle_since = time.monotonic()
+    while pending:
+        deadline = min(started.get(index, idle_since) for index in pending.values()) + tool_timeout_seconds
+        done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                contents[index] = future.result()
+            except Exception as e:
+                contents[index] = f"Tool call failed: {e}"
+        if done:
+            idle_since = time.monotonic()
+        now = time.monotonic()
+        for future, index in list(pending.items()):
+            if now - started.get(index, idle_since) >= tool_timeout_seconds:
+                del pending[future]
+                future.cancel()
+                print(f"\nTool: {tool_calls[index]['name']} timed out after {tool_timeout_seconds}s.")
+                contents[index] = f"Tool call timed out after {tool_timeout_seconds} seconds. Try a narrower query."
+
+    # Appends the Tool Messages in the order the model asked for them
+    results = [
+        ToolMessage(tool_call_id=t['id'], name=t['name'], content=contents[index])
+        for index, t in enumerate(tool_calls)
+    ]
 
     print("Tools Execution Complete. Back to the model!")
     return {'messages': results}
@@ -151,5 +257,7 @@ def running_agent():
         print("\n=== ANSWER ===")
         print(result['messages'][-1].content)
 
+    print(f"Embedding cache: {embedding.stats()}")
+
 
 running_agent()
\ No newline at end of file
@@ -0,0 +1,99 @@
+from langchain_core.documents import Document
+from typing import Callable, List, Optional
+
+
+def approximate_tokens(text: str) -> int:
+    """Roughly four characters per token, which is close enough for budgeting prompts."""
+    return max(1, len(text) // 4)
+
+
+def _suffix_prefix_overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _Passage:
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content
+        self.metadata = dict(doc.metadata)
+        self.rank = rank
+        self.start = doc.metadata.get("start_index")
+        self.chunk_ids = [doc.id] if doc.id else []
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+    def absorb(self, other: "_Passage", max_overlap: int, max_gap: int, min_overlap: int = 20) -> bool:
+        """Append other if it overlaps, touches or is contained in this passage."""
+        if other.text in self.text:
+            self._merge_meta(other)
+            return True
+
+        overlap = _suffix_prefix_overlap(self.text, other.text, max_overlap)
+        if overlap >= min_overlap:
+            self.text += other.text[overlap:]
+        elif self.end is not None and other.start is not None and 0 <= other.start - self.end <= max_gap:
+            self.text += "\n" + other.text
+        else:
+            return False
+        self._merge_meta(other)
+        return True
+
+    def _merge_meta(self, other: "_Passage"):
+        self.rank = min(self.rank, other.rank)
+        self.chunk_ids.extend(chunk_id for chunk_id in other.chunk_ids if chunk_id not in self.chunk_ids)
+
+    def to_document(self) -> Document:
+        metadata = dict(self.metadata)
+        metadata["chunk_ids"] = self.chunk_ids
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def pack_context(
+    docs: List[Document],
+    max_tokens: int = 1500,
+    max_overlap: int = 400,
+    max_gap: int = 2,
+    token_counter: Callable[[str], int] = approximate_tokens,
+) -> List[Document]:
+    """
+    Merge retrieved chunks into non-redundant passages that fit a token budget.
+
+    Chunks from the same source and page are ordered by their start_index
+    (falling back to retrieval rank) and merged when they overlap or touch, so
+    the text shared by neighbouring chunks is sent only once. Passages are then
+    emitted in order of their best retrieval rank until max_tokens is reached;
+    the last passage is truncated to fit.
+    """
+    groups: dict = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get("doc_id") or doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append(_Passage(doc, rank))
+
+    passages: List[_Passage] = []
+    for members in groups.values():
+        members.sort(key=lambda p: (p.start is None, p.start if p.start is not None else 0, p.rank))
+        merged: List[_Passage] = []
+        for passage in members:
+            if not any(existing.absorb(passage, max_overlap, max_gap) for existing in merged):
+                merged.append(passage)
+        passages.extend(merged)
+
+    passages.sort(key=lambda p: p.rank)
+
+    packed: List[Document] = []
+    remaining = max_tokens
+    for passage in passages:
+        cost = token_counter(passage.text)
+        if cost > remaining:
+            if remaining > 50:
+                passage.text = passage.text[: len(passage.text) * remaining // cost]
+                packed.append(passage.to_document())
+            break
+        packed.append(passage.to_document())
+        remaining -= cost
+    return packed
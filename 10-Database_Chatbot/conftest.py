@@ -0,0 +1,49 @@
+import sqlite3
+from typing import Annotated, TypedDict
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def chat(state: State) -> State:
+    return {"messages": [AIMessage(content="answer")]}
+
+
+def build(saver, *nodes):
+    """Compile a graph that runs the given nodes (default: chat) in order."""
+    nodes = nodes or (chat,)
+    builder = StateGraph(State)
+    previous = START
+    for node in nodes:
+        builder.add_node(node.__name__, node)
+        builder.add_edge(previous, node.__name__)
+        previous = node.__name__
+    builder.add_edge(previous, END)
+    return builder.compile(checkpointer=saver)
+
+
+def config(thread_id: str = "a") -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def converse(graph, turns: int = 1, thread_id: str = "a"):
+    for turn in range(turns):
+        graph.invoke({"messages": [HumanMessage(content=f"question {turn}")]}, config(thread_id))
+
+
+def messages(graph, thread_id: str = "a") -> list:
+    return graph.get_state(config(thread_id)).values["messages"]
+
+
+def contents(messages) -> list:
+    # Message ids are random per run, so compare what the model would see.
+    return [(message.type, message.content) for message in messages]
+
+
+def connect(path) -> sqlite3.Connection:
+    return sqlite3.connect(str(path), check_same_thread=False)
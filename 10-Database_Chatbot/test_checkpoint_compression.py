@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from CheckpointCompression import CompressedSerializer, blob_bytes, migrate, train_dictionary
+from MessageDeltas import MessageDeltaSaver
+from conftest import State, build, connect, contents, converse, messages
+
+CODECS = ["zlib", "zstd"]
+PAYLOAD = {"messages": ["You are a helpful assistant. " * 40, {"tool": "rag_tool", "args": {"query": "revenue"}}]}
+
+
+def require(codec: str) -> None:
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+
+
+def chat(state: State) -> State:
+    return {"messages": [AIMessage(content="The report covers revenue, margins and guidance. " * 20)]}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(codec):
+    require(codec)
+    serde = CompressedSerializer(codec)
+    type_, data = serde.dumps_typed(PAYLOAD)
+    assert type_.endswith(f"+{codec}")
+    assert serde.loads_typed((type_, data)) == PAYLOAD
+    # Switching compression off still reads what was written with it.
+    assert CompressedSerializer(None).loads_typed((type_, data)) == PAYLOAD
+
+
+def test_small_payloads_stay_uncompressed():
+    serde = CompressedSerializer("zlib")
+    type_, data = serde.dumps_typed({"a": 1})
+    assert "+" not in type_
+    assert serde.loads_typed((type_, data)) == {"a": 1}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_dictionary_round_trip(tmp_path, codec):
+    require(codec)
+    path = tmp_path / "chatbot.db"
+    converse(build(SqliteSaver(connect(path)), chat), 20)
+    dictionary_id = train_dictionary(str(path), codec, size=4096)
+
+    writer = CompressedSerializer(codec, path=str(path))
+    assert writer.dictionary_id == dictionary_id
+    type_, data = writer.dumps_typed(PAYLOAD)
+    # A reader that writes uncompressed still loads the dictionary to read.
+    assert CompressedSerializer(None, path=str(path)).loads_typed((type_, data)) == PAYLOAD
+
+    with sqlite3.connect(str(path)) as conn:
+        conn.execute("DELETE FROM compression_dictionaries")
+    with pytest.raises(ValueError):
+        CompressedSerializer(None, path=str(path)).loads_typed((type_, data))
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_saver_round_trip(tmp_path, codec):
+    require(codec)
+    plain = build(SqliteSaver(connect(tmp_path / "plain.db")), chat)
+    path = tmp_path / "compressed.db"
+    compressed = build(
+        MessageDeltaSaver(connect(path), serde=CompressedSerializer(codec, path=str(path)), snapshot_every=4), chat
+    )
+    converse(plain, 6)
+    converse(compressed, 6)
+    assert contents(messages(compressed)) == contents(messages(plain))
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_migrate_recompresses_and_reads_back(tmp_path, codec):
+    require(codec)
+    path = tmp_path / "chatbot.db"
+    graph = build(MessageDeltaSaver(connect(path)), chat)
+    converse(graph, 10)
+    expected = contents(messages(graph))
+    before = blob_bytes(str(path))
+
+    train_dictionary(str(path), codec, size=4096)
+    assert migrate(str(path), CompressedSerializer(codec, path=str(path))) > 0
+    after = blob_bytes(str(path))
+    assert sum(after.values()) < sum(before.values())
+
+    reader = build(MessageDeltaSaver(connect(path), serde=CompressedSerializer(None, path=str(path))), chat)
+    assert contents(messages(reader)) == expected
+
+    # Migrating with codec None writes everything back uncompressed.
+    migrate(str(path), CompressedSerializer(None, path=str(path)))
+    assert contents(messages(build(MessageDeltaSaver(connect(path)), chat))) == expected
+
+
+def test_foreign_suffix_is_left_alone():
+    serde = CompressedSerializer("zlib")
+    assert serde.decompress("msgpack+aes", b"secret") == ("msgpack+aes", b"secret")
+
+
+def test_serializer_adds_no_schema(tmp_path):
+    path = tmp_path / "chatbot.db"
+    CompressedSerializer("zlib", path=str(path))
+    assert sqlite3.connect(str(path)).execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
@@ -0,0 +1,142 @@
+import sqlite3
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.types import Command, interrupt
+
+from CheckpointCompression import CompressedSerializer
+from CheckpointRetention import CheckpointRetention, checkpoint_time
+from MessageDeltas import MessageDeltaSaver
+from ThreadRegistry import RegisteredSqliteSaver
+from conftest import State, build, config, connect, contents, converse, messages
+
+
+def chat(state: State) -> State:
+    return {"messages": [AIMessage(content="answer " * 200)]}
+
+
+def approve(state: State) -> State:
+    if state["messages"][-2].content == "stop":
+        interrupt("continue?")
+    return {}
+
+
+def count(conn: sqlite3.Connection, sql: str, *params) -> int:
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def test_checkpoint_time_is_the_write_time(tmp_path):
+    conn = connect(tmp_path / "chatbot.db")
+    converse(build(SqliteSaver(conn), chat, approve), 1)
+    latest = count(conn, "SELECT MAX(checkpoint_id) FROM checkpoints")
+    assert abs(checkpoint_time(latest) - time.time()) < 60
+
+
+def test_keeps_last_checkpoints_of_every_thread(tmp_path):
+    path = tmp_path / "chatbot.db"
+    conn = connect(path)
+    graph = build(SqliteSaver(conn), chat, approve)
+    for thread in range(5):
+        converse(graph, 6, f"t{thread}")
+    expected = contents(messages(graph, "t3"))
+
+    stats = CheckpointRetention(str(path), keep_last=3, threads_per_batch=2).run_once()
+    assert stats["threads"] == 5 and stats["checkpoints"] > 0
+    for thread in range(5):
+        assert count(conn, "SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", f"t{thread}") == 3
+    assert count(
+        conn,
+        "SELECT COUNT(*) FROM writes w WHERE NOT EXISTS (SELECT 1 FROM checkpoints c WHERE "
+        "c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id)",
+    ) == 0
+
+    assert contents(messages(graph, "t3")) == expected
+    converse(graph, 1, "t3")
+    assert len(messages(graph, "t3")) == len(expected) + 2
+
+
+def test_max_age_keeps_recent_checkpoints(tmp_path):
+    path = tmp_path / "chatbot.db"
+    conn = connect(path)
+    converse(build(SqliteSaver(conn), chat, approve), 6)
+    before = count(conn, "SELECT COUNT(*) FROM checkpoints")
+    stats = CheckpointRetention(str(path), keep_last=1, max_age_seconds=3600).run_once()
+    assert stats["checkpoints"] == 0
+    assert count(conn, "SELECT COUNT(*) FROM checkpoints") == before
+
+
+def test_keeps_interrupted_checkpoints(tmp_path):
+    path = tmp_path / "chatbot.db"
+    conn = connect(path)
+    graph = build(SqliteSaver(conn), chat, approve)
+    converse(graph, 2)
+    graph.invoke({"messages": [HumanMessage(content="stop")]}, config())
+    converse(graph, 2, "b")
+    interrupted = count(
+        conn, "SELECT checkpoint_id FROM writes WHERE thread_id = 'a' AND channel = '__interrupt__'"
+    )
+
+    CheckpointRetention(str(path), keep_last=1).run_once()
+    assert count(conn, "SELECT COUNT(*) FROM checkpoints WHERE checkpoint_id = ?", interrupted) == 1
+    assert graph.get_state(config()).next == ("approve",)
+    result = graph.invoke(Command(resume="yes"), config())
+    assert result["messages"][-2].content == "stop"
+
+
+def test_keeps_delta_chains(tmp_path):
+    path = tmp_path / "chatbot.db"
+    conn = connect(path)
+    graph = build(MessageDeltaSaver(conn, snapshot_every=8), chat, approve)
+    converse(graph, 6)
+    history = [contents(state.values.get("messages", [])) for state in graph.get_state_history(config())]
+
+    CheckpointRetention(str(path), keep_last=2).run_once()
+    assert count(
+        conn,
+        "SELECT COUNT(*) FROM checkpoint_messages m WHERE base_checkpoint_id IS NOT NULL AND NOT EXISTS "
+        "(SELECT 1 FROM checkpoint_messages b WHERE b.thread_id = m.thread_id "
+        "AND b.checkpoint_ns = m.checkpoint_ns AND b.checkpoint_id = m.base_checkpoint_id)",
+    ) == 0
+    fresh = build(MessageDeltaSaver(connect(path), snapshot_every=8), chat, approve)
+    kept = list(fresh.get_state_history(config()))
+    assert 2 <= len(kept) < len(history)
+    for state in kept[:2]:
+        assert contents(state.values["messages"]) in history
+
+
+def test_incremental_vacuum_returns_pages(tmp_path):
+    path = tmp_path / "chatbot.db"
+    retention = CheckpointRetention(str(path), keep_last=1, vacuum_pages=0)
+    conn = connect(path)
+    assert count(conn, "PRAGMA auto_vacuum") == 2
+    converse(build(SqliteSaver(conn), chat, approve), 20)
+    assert retention.run_once()["pages_freed"] > 0
+    assert count(conn, "PRAGMA freelist_count") == 0
+
+
+def test_background_pass_skips_vacuum_until_converted(tmp_path):
+    path = tmp_path / "chatbot.db"
+    conn = connect(path)
+    converse(build(SqliteSaver(conn), chat, approve), 10)
+    retention = CheckpointRetention(str(path), keep_last=1)
+    assert count(conn, "PRAGMA auto_vacuum") == 0
+    assert retention.run_once()["pages_freed"] == 0
+
+    retention.enable_incremental_vacuum()
+    assert count(sqlite3.connect(str(path)), "PRAGMA auto_vacuum") == 2
+
+
+def test_backend_construction_order_enables_incremental_vacuum(tmp_path):
+    # Same order as Backend.py: retention, then the checkpoint connection,
+    # the compressed serializer and the saver.
+    path = str(tmp_path / "chatbot.db")
+    retention = CheckpointRetention(path, keep_last=1, vacuum_pages=0)
+    conn = connect(path)
+    serde = CompressedSerializer("zlib", path=path)
+    graph = build(RegisteredSqliteSaver(conn=conn, serde=serde), chat, approve)
+    converse(graph, 20)
+
+    assert count(sqlite3.connect(path), "PRAGMA auto_vacuum") == 2
+    assert retention.run_once()["pages_freed"] > 0
+    assert len(messages(graph)) == 40
@@ -0,0 +1,74 @@
+from langchain_core.messages import AIMessage, RemoveMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from MessageDeltas import MessageDeltaSaver
+from conftest import State, build, config, connect, contents, converse, messages
+
+
+def chat(state: State) -> State:
+    reply = [AIMessage(content=f"answer {len(state['messages'])}")]
+    if len(state["messages"]) == 9:
+        # Removing a message changes the shared prefix, not just the tail.
+        reply.append(RemoveMessage(id=state["messages"][3].id))
+    return {"messages": reply}
+
+
+def test_history_matches_plain_saver(tmp_path):
+    plain = build(SqliteSaver(connect(tmp_path / "plain.db")), chat)
+    deltas = build(MessageDeltaSaver(connect(tmp_path / "deltas.db"), snapshot_every=4), chat)
+    converse(plain, 12)
+    converse(deltas, 12)
+
+    assert contents(messages(deltas)) == contents(messages(plain))
+    expected = list(plain.get_state_history(config()))
+    history = list(deltas.get_state_history(config()))
+    assert len(history) == len(expected)
+    for got, want in zip(history, expected):
+        assert contents(got.values.get("messages", [])) == contents(want.values.get("messages", []))
+
+
+def test_stores_tails_and_periodic_snapshots(tmp_path):
+    conn = connect(tmp_path / "deltas.db")
+    converse(build(MessageDeltaSaver(conn, snapshot_every=4), chat), 6)
+
+    rows = conn.execute(
+        "SELECT base_checkpoint_id, keep, depth FROM checkpoint_messages ORDER BY checkpoint_id"
+    ).fetchall()
+    assert all(depth < 4 for _, _, depth in rows)
+    assert sum(base is None for base, _, _ in rows) > 1
+    # Deltas keep the parent's messages instead of storing them again.
+    assert any(keep > 0 for base, keep, _ in rows if base is not None)
+    # The messages channel is no longer stored inline in the checkpoint blob.
+    saver = SqliteSaver(conn)
+    latest = saver.get_tuple(config())
+    assert "messages" not in latest.checkpoint["channel_values"]
+
+
+def test_rebuilds_without_cache(tmp_path):
+    path = tmp_path / "deltas.db"
+    graph = build(MessageDeltaSaver(connect(path), snapshot_every=4), chat)
+    converse(graph, 7)
+    expected = contents(messages(graph))
+
+    fresh = build(MessageDeltaSaver(connect(path), snapshot_every=4), chat)
+    assert contents(messages(fresh)) == expected
+    converse(fresh, 1)
+    assert len(messages(fresh)) == len(expected) + 2
+
+
+def test_reads_checkpoints_written_without_deltas(tmp_path):
+    path = tmp_path / "chatbot.db"
+    converse(build(SqliteSaver(connect(path)), chat), 3)
+    graph = build(MessageDeltaSaver(connect(path)), chat)
+    assert len(messages(graph)) == 6
+    converse(graph, 1)
+    assert contents(messages(graph))[-2:] == [("human", "question 0"), ("ai", "answer 7")]
+
+
+def test_delete_thread_removes_deltas(tmp_path):
+    conn = connect(tmp_path / "deltas.db")
+    saver = MessageDeltaSaver(conn)
+    converse(build(saver, chat), 3)
+    saver.delete_thread("a")
+    assert conn.execute("SELECT COUNT(*) FROM checkpoint_messages").fetchone()[0] == 0
+    assert saver.get_tuple(config()) is None
@@ -0,0 +1,84 @@
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from ThreadRegistry import RegisteredSqliteSaver
+from conftest import build, connect, converse
+
+
+def all_pages(saver, limit: int, **kwargs) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        threads, cursor = saver.threads_page(limit, cursor, **kwargs)
+        pages.append([thread["thread_id"] for thread in threads])
+        if cursor is None:
+            return pages
+
+
+def test_registers_threads_on_write(tmp_path):
+    saver = RegisteredSqliteSaver(connect(tmp_path / "chatbot.db"))
+    graph = build(saver)
+    converse(graph, 2, "a")
+    converse(graph, 1, "b")
+
+    assert saver.list_threads() == ["a", "b"]
+    threads, cursor = saver.threads_page()
+    assert cursor is None
+    assert [(thread["thread_id"], thread["message_count"]) for thread in threads] == [("b", 2), ("a", 4)]
+
+    saver.delete_thread("a")
+    assert saver.list_threads() == ["b"]
+
+
+def test_pages_cover_every_thread_once(tmp_path):
+    conn = connect(tmp_path / "chatbot.db")
+    saver = RegisteredSqliteSaver(conn)
+    saver.setup()
+    # Equal timestamps make the thread_id tiebreak in the cursor matter.
+    conn.executemany(
+        "INSERT INTO threads (thread_id, created_at, updated_at, message_count) VALUES (?, 0, ?, 0)",
+        [(f"thread-{index:02d}", float(index // 3)) for index in range(23)],
+    )
+    conn.commit()
+
+    pages = all_pages(saver, 5)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    listed = [thread_id for page in pages for thread_id in page]
+    assert listed == sorted(listed, key=lambda thread_id: (int(thread_id[-2:]) // 3, thread_id), reverse=True)
+    assert len(set(listed)) == 23
+
+
+def test_search_by_substring_and_prefix(tmp_path):
+    conn = connect(tmp_path / "chatbot.db")
+    saver = RegisteredSqliteSaver(conn)
+    saver.setup()
+    conn.executemany(
+        "INSERT INTO threads (thread_id, created_at, updated_at, message_count) VALUES (?, 0, ?, 0)",
+        [(thread_id, float(index)) for index, thread_id in enumerate(["report-1", "my_report", "my-report", "notes"])],
+    )
+    conn.commit()
+
+    assert all_pages(saver, 1, search="report") == [["my-report"], ["my_report"], ["report-1"]]
+    assert all_pages(saver, 10, search="report", match="prefix") == [["report-1"]]
+    # LIKE wildcards in the search text are matched literally.
+    assert all_pages(saver, 10, search="my_") == [["my_report"]]
+
+
+def test_backfills_existing_database(tmp_path):
+    path = tmp_path / "chatbot.db"
+    graph = build(SqliteSaver(connect(path)))
+    converse(graph, 3, "old")
+
+    saver = RegisteredSqliteSaver(connect(path))
+    threads, _ = saver.threads_page()
+    assert [(thread["thread_id"], thread["message_count"]) for thread in threads] == [("old", 6)]
+    assert threads[0]["created_at"] <= threads[0]["updated_at"]
+
+
+def test_backfill_counts_delta_encoded_messages(tmp_path):
+    path = tmp_path / "chatbot.db"
+    conn = connect(path)
+    converse(build(RegisteredSqliteSaver(conn)), 3)
+    conn.execute("DELETE FROM threads")
+    conn.commit()
+
+    threads, _ = RegisteredSqliteSaver(connect(path)).threads_page()
+    assert [(thread["thread_id"], thread["message_count"]) for thread in threads] == [("a", 6)]
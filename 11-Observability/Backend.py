@@ -4,8 +4,11 @@ from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_groq import ChatGroq
 from langgraph.graph.message import add_messages 
 from dotenv import load_dotenv
-from langgraph.checkpoint.sqlite import SqliteSaver
+from ThreadRegistry import RegisteredSqliteSaver
+from CheckpointRetention import CheckpointRetention
+from CheckpointCompression import CompressedSerializer
 import sqlite3
+import os
 
 load_dotenv()
 
@@ -32,9 +35,36 @@ graph_builder.add_node("chat_node", chatNode)
 graph_builder.add_edge(START, "chat_node")
 graph_builder.add_edge("chat_node", END)
 
+# Prune old checkpoints in the background so chatbot.db stays proportional to
+# the live conversations: keep the last CHECKPOINT_KEEP_LAST per thread, or every
+# checkpoint younger than CHECKPOINT_MAX_AGE_DAYS when that is set (0 disables
+# the age window). CHECKPOINT_KEEP_LAST=0 turns retention off. It is set up
+# before anything else opens chatbot.db, so a new database gets incremental
+# auto_vacuum before its first table exists.
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("CHECKPOINT_MAX_AGE_DAYS", "0"))
+CHECKPOINT_RETENTION_INTERVAL = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "300"))
+
+checkpoint_retention = CheckpointRetention(
+    'chatbot.db',
+    keep_last=CHECKPOINT_KEEP_LAST,
+    max_age_seconds=CHECKPOINT_MAX_AGE_DAYS * 86400 or None,
+    interval_seconds=CHECKPOINT_RETENTION_INTERVAL,
+)
+if CHECKPOINT_KEEP_LAST > 0:
+    checkpoint_retention.start()
+
 conn = sqlite3.connect('chatbot.db', check_same_thread=False)
 
-checkPointer = SqliteSaver(conn=conn)
+# Checkpoint and pending-write blobs are compressed with CHECKPOINT_COMPRESSION
+# ("zlib", "zstd" or "none"); rows written before stay readable either way.
+# CheckpointCompression.py trains a dictionary and recompresses existing rows.
+CHECKPOINT_COMPRESSION = os.getenv("CHECKPOINT_COMPRESSION", "zlib")
+checkpoint_serde = CompressedSerializer(
+    None if CHECKPOINT_COMPRESSION == "none" else CHECKPOINT_COMPRESSION, path='chatbot.db'
+)
+
+checkPointer = RegisteredSqliteSaver(conn=conn, serde=checkpoint_serde)
 
 graph = graph_builder.compile(checkpointer=checkPointer)
 
@@ -48,8 +78,4 @@ graph = graph_builder.compile(checkpointer=checkPointer)
 
 
 def listThreads():
-    allthreads = set()
-    for checkPoint in checkPointer.list(None):
-        allthreads.add(checkPoint.config['configurable']['thread_id'])
-
-    return list(allthreads)
+    return checkPointer.list_threads()
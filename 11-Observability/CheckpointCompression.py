@@ -0,0 +1,302 @@
+"""
+Transparent compression of checkpoint and pending-write blobs.
+
+CompressedSerializer wraps the saver's serializer the same way LangGraph's
+EncryptedSerializer does: the codec name is appended to the type tag
+("msgpack+zstd"), and rows without a suffix are read as they always were.
+Each compressed blob starts with a format version byte and the id of the
+dictionary it was compressed with (0 for none).
+
+Checkpoints repeat the same system prompts, tool schemas and message
+envelopes, so a dictionary trained on the database itself compresses them
+far better than a blank codec. To train one and recompress an existing
+database (stop the app first, or expect the pass to wait on its writes):
+
+    python CheckpointCompression.py --db chatbot.db --codec zstd --train --migrate
+"""
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from typing import Any, Optional
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BI")  # format version, dictionary id
+
+DICTIONARIES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS compression_dictionaries (
+    dictionary_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# (table, type column, blob column) for every serde-encoded blob in chatbot.db.
+BLOB_COLUMNS = [
+    ("checkpoints", "type", "checkpoint"),
+    ("writes", "type", "value"),
+    ("checkpoint_messages", "type", "tail"),
+]
+
+
+class ZlibCodec:
+    """Standard library codec; a preset dictionary is used up to its 32 KiB window."""
+
+    name = "zlib"
+
+    def __init__(self, level: Optional[int] = None):
+        self.level = 6 if level is None else level
+
+    def compress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        compressor = zlib.compressobj(self.level, zdict=dictionary) if dictionary else zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def train(self, samples: list[bytes], size: int) -> bytes:
+        # zlib has no trainer. Its preset dictionary is plain history, and it
+        # prefers matches near the end, so keep the latest samples' bytes.
+        size = min(size, 32 * 1024)
+        return b"".join(samples)[-size:]
+
+
+class ZstdCodec:
+    """Zstandard, via the optional ``zstandard`` package."""
+
+    name = "zstd"
+
+    def __init__(self, level: Optional[int] = None):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "zstandard is not installed. Please install it with `pip install zstandard`."
+            ) from None
+        self._zstd = zstandard
+        self.level = 3 if level is None else level
+        self._prepared: dict = {}
+        self._lock = threading.Lock()
+
+    def _dictionary(self, dictionary: Optional[bytes]):
+        if not dictionary:
+            return None
+        with self._lock:
+            prepared = self._prepared.get(dictionary)
+            if prepared is None:
+                prepared = self._prepared[dictionary] = self._zstd.ZstdCompressionDict(dictionary)
+            return prepared
+
+    def compress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        # Compressor objects are not thread-safe, so each call gets its own.
+        return self._zstd.ZstdCompressor(level=self.level, dict_data=self._dictionary(dictionary)).compress(data)
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        return self._zstd.ZstdDecompressor(dict_data=self._dictionary(dictionary)).decompress(data)
+
+    def train(self, samples: list[bytes], size: int) -> bytes:
+        return self._zstd.train_dictionary(size, samples).as_bytes()
+
+
+CODECS = {"zlib": ZlibCodec, "zstd": ZstdCodec}
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    Serializer that compresses the bytes of another serializer.
+
+    ``codec`` is "zlib", "zstd" or None; with None nothing new is compressed
+    but compressed rows still read back, so compression can be switched off
+    without migrating. Payloads under ``min_size`` bytes are stored as is.
+    """
+
+    def __init__(
+        self,
+        codec: Optional[str] = "zlib",
+        serde: Optional[SerializerProtocol] = None,
+        level: Optional[int] = None,
+        min_size: int = 256,
+        path: Optional[str] = None,
+    ):
+        self.serde = serde or JsonPlusSerializer()
+        self.codec = CODECS[codec](level) if codec else None
+        self.min_size = min_size
+        self.path = path
+        self._codecs = {self.codec.name: self.codec} if self.codec else {}
+        self._dictionaries: dict[int, bytes] = {}
+        self.dictionary_id = 0
+        self._lock = threading.Lock()
+        if path:
+            self.reload_dictionaries()
+
+    def reload_dictionaries(self):
+        """Read every stored dictionary and write with the newest one for this codec."""
+        # Read-only: the table is created by train_dictionary, so opening a
+        # serializer never adds schema to the checkpoint database.
+        conn = sqlite3.connect(self.path)
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'compression_dictionaries'"
+            ).fetchone()
+            rows = []
+            if exists:
+                rows = conn.execute("SELECT dictionary_id, codec, data FROM compression_dictionaries").fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for dictionary_id, codec, data in rows:
+                self._dictionaries[dictionary_id] = data
+                if self.codec and codec == self.codec.name:
+                    self.dictionary_id = max(self.dictionary_id, dictionary_id)
+
+    def _codec(self, name: str):
+        codec = self._codecs.get(name)
+        if codec is None:
+            codec = self._codecs[name] = CODECS[name]()
+        return codec
+
+    def _dictionary(self, dictionary_id: int) -> Optional[bytes]:
+        if not dictionary_id:
+            return None
+        if dictionary_id not in self._dictionaries and self.path:
+            # Trained after this process started.
+            self.reload_dictionaries()
+        try:
+            return self._dictionaries[dictionary_id]
+        except KeyError:
+            raise ValueError(f"Compression dictionary {dictionary_id} is not in the database") from None
+
+    def compress(self, type_: str, data: bytes) -> tuple[str, bytes]:
+        if self.codec is None or data is None or len(data) < self.min_size:
+            return type_, data
+        dictionary_id = self.dictionary_id
+        payload = self.codec.compress(data, self._dictionary(dictionary_id))
+        return f"{type_}+{self.codec.name}", _HEADER.pack(FORMAT_VERSION, dictionary_id) + payload
+
+    def decompress(self, type_: str, data: bytes) -> tuple[str, bytes]:
+        if type_ is None or "+" not in type_:
+            return type_, data
+        base_type, codec = type_.rsplit("+", 1)
+        if codec not in CODECS:
+            # Some other wrapper's suffix (e.g. EncryptedSerializer); not ours.
+            return type_, data
+        version, dictionary_id = _HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compressed checkpoint format {version}")
+        return base_type, self._codec(codec).decompress(data[_HEADER.size:], self._dictionary(dictionary_id))
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        return self.compress(*self.serde.dumps_typed(obj))
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        return self.serde.loads_typed(self.decompress(*data))
+
+
+def _existing_columns(conn: sqlite3.Connection) -> list[tuple[str, str, str]]:
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [column for column in BLOB_COLUMNS if column[0] in tables]
+
+
+def train_dictionary(path: str, codec: str = "zstd", size: int = 110 * 1024, samples: int = 2000) -> int:
+    """Train a dictionary on a random sample of the database's blobs and store it; returns its id."""
+    reader = CompressedSerializer(None, path=path)
+    conn = sqlite3.connect(path)
+    try:
+        sample: list[bytes] = []
+        columns = _existing_columns(conn)
+        for table, type_column, blob_column in columns:
+            rows = conn.execute(
+                f"SELECT {type_column}, {blob_column} FROM {table} WHERE {blob_column} IS NOT NULL "
+                f"ORDER BY RANDOM() LIMIT ?",
+                (samples // len(columns),),
+            )
+            sample.extend(reader.decompress(type_, blob)[1] for type_, blob in rows)
+        if not sample:
+            raise ValueError(f"{path} has no checkpoints to train on")
+        data = CODECS[codec]().train(sample, size)
+        conn.executescript(DICTIONARIES_SCHEMA)
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO compression_dictionaries (codec, data, created_at) VALUES (?, ?, ?)",
+                (codec, data, time.time()),
+            )
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def blob_bytes(path: str) -> dict:
+    """Total stored bytes per blob column."""
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            f"{table}.{blob_column}": conn.execute(f"SELECT COALESCE(SUM(LENGTH({blob_column})), 0) FROM {table}").fetchone()[0]
+            for table, _, blob_column in _existing_columns(conn)
+        }
+    finally:
+        conn.close()
+
+
+def migrate(path: str, serializer: CompressedSerializer, batch: int = 500) -> int:
+    """
+    Re-encode every blob with serializer's codec and dictionary (codec None
+    decompresses). Works on raw bytes, so nothing is deserialized. Each batch
+    is its own transaction, so a running app only waits for one batch.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    rewritten = 0
+    try:
+        for table, type_column, blob_column in _existing_columns(conn):
+            last_rowid = 0
+            while True:
+                rows = conn.execute(
+                    f"SELECT rowid, {type_column}, {blob_column} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch),
+                ).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for rowid, type_, blob in rows:
+                    encoded = serializer.compress(*serializer.decompress(type_, blob))
+                    if encoded != (type_, blob):
+                        updates.append((*encoded, rowid))
+                with conn:
+                    conn.executemany(
+                        f"UPDATE {table} SET {type_column} = ?, {blob_column} = ? WHERE rowid = ?", updates
+                    )
+                rewritten += len(updates)
+                last_rowid = rows[-1][0]
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return rewritten
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="chatbot.db")
+    parser.add_argument("--codec", choices=["zlib", "zstd", "none"], default="zlib")
+    parser.add_argument("--level", type=int)
+    parser.add_argument("--train", action="store_true", help="Train a dictionary on the database first")
+    parser.add_argument("--dictionary-size", type=int, default=110 * 1024)
+    parser.add_argument("--migrate", action="store_true", help="Recompress every existing blob")
+    args = parser.parse_args()
+
+    codec = None if args.codec == "none" else args.codec
+    if args.train and codec:
+        print(f"trained dictionary {train_dictionary(args.db, codec, args.dictionary_size)}")
+    before = blob_bytes(args.db)
+    if args.migrate:
+        serializer = CompressedSerializer(codec, level=args.level, path=args.db)
+        print(f"rewrote {migrate(args.db, serializer)} blobs")
+    after = blob_bytes(args.db)
+    for column, size in before.items():
+        print(f"{column:<32} {size / 2**20:>9.2f} MiB -> {after[column] / 2**20:>9.2f} MiB")
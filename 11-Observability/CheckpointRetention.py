@@ -0,0 +1,234 @@
+"""
+Retention and compaction for the SqliteSaver checkpoint database.
+
+Every super-step writes a checkpoint that is never deleted, so chatbot.db and
+its WAL grow with the total number of steps ever taken. CheckpointRetention
+trims old checkpoints in the background and hands the freed pages back to the
+filesystem, keeping the database proportional to the live conversations.
+
+Returning pages needs auto_vacuum=INCREMENTAL, which an existing database
+only gets from a full VACUUM. That rewrites the whole file under an exclusive
+lock, so it is left to this command, run once while the app is stopped:
+
+    python CheckpointRetention.py --db chatbot.db --keep-last 20
+"""
+from typing import Optional
+import sqlite3
+import threading
+import time
+
+# checkpoint_ids are UUIDv6: the first 60 bits are 100 ns ticks since 1582-10-15.
+_UUID_EPOCH_TICKS = 0x01B21DD213814000
+
+
+def checkpoint_time(checkpoint_id: str) -> float:
+    """Unix time encoded in a LangGraph checkpoint_id."""
+    digits = checkpoint_id.replace("-", "")
+    ticks = (int(digits[:12], 16) << 12) | int(digits[13:16], 16)
+    return (ticks - _UUID_EPOCH_TICKS) / 1e7
+
+
+class CheckpointRetention:
+    """
+    Keeps the last ``keep_last`` checkpoints of every thread and namespace, or
+    (with ``max_age_seconds``) every checkpoint younger than that, whichever
+    keeps more. Regardless of the policy it never deletes:
+
+    * the latest checkpoint of a thread/namespace, which is what a conversation
+      resumes from;
+    * checkpoints that recorded an interrupt, so human-in-the-loop runs can
+      always be resumed;
+    * the delta chain of every checkpoint it keeps, back to the last full
+      snapshot, when messages are delta-encoded (MessageDeltas.py).
+
+    Writes whose checkpoint is gone are deleted. Each pass handles
+    ``threads_per_batch`` threads per transaction so the saver is never
+    blocked for long, then runs an incremental VACUUM (on databases converted
+    by enable_incremental_vacuum) and a WAL checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: str = "chatbot.db",
+        keep_last: int = 20,
+        max_age_seconds: Optional[float] = None,
+        interval_seconds: float = 300.0,
+        threads_per_batch: int = 200,
+        vacuum_pages: int = 2000,
+    ):
+        # vacuum_pages bounds how many free pages each pass returns to the
+        # filesystem (0 returns all of them), so the background pass stays short.
+        self.keep_last = max(1, keep_last)
+        self.max_age_seconds = max_age_seconds
+        self.interval_seconds = interval_seconds
+        self.threads_per_batch = threads_per_batch
+        self.vacuum_pages = vacuum_pages
+        self.last_run: dict = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.create_function("checkpoint_time", 1, checkpoint_time, deterministic=True)
+        if self._conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+            # A brand-new database takes the setting without a VACUUM.
+            self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _tables_exist(self) -> bool:
+        found = self._conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('checkpoints', 'writes')"
+        ).fetchone()[0]
+        return found == 2
+
+    def _incremental_vacuum_enabled(self) -> bool:
+        return self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def enable_incremental_vacuum(self):
+        """One-time full VACUUM that switches the database to auto_vacuum=INCREMENTAL."""
+        if not self._incremental_vacuum_enabled():
+            self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._conn.execute("VACUUM")
+
+    def _has_message_deltas(self) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoint_messages'"
+        ).fetchone() is not None
+
+    def _prune_thread(self, thread_id: str, cutoff: Optional[float], deltas: bool) -> tuple[int, int]:
+        deleted_checkpoints = 0
+        namespaces = [
+            namespace for (namespace,) in self._conn.execute(
+                "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            )
+        ]
+        for namespace in namespaces:
+            sql = (
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?1 AND checkpoint_ns = ?2 "
+                "AND checkpoint_id NOT IN (SELECT checkpoint_id FROM checkpoints "
+                "WHERE thread_id = ?1 AND checkpoint_ns = ?2 ORDER BY checkpoint_id DESC LIMIT ?3) "
+                "AND checkpoint_id NOT IN (SELECT checkpoint_id FROM writes "
+                "WHERE thread_id = ?1 AND checkpoint_ns = ?2 AND channel = '__interrupt__')"
+            )
+            params = [thread_id, namespace, self.keep_last]
+            if cutoff is not None:
+                sql += " AND checkpoint_time(checkpoint_id) < ?4"
+                params.append(cutoff)
+            expired = {checkpoint_id for (checkpoint_id,) in self._conn.execute(sql, params)}
+            if expired and deltas:
+                expired -= self._delta_ancestors(thread_id, namespace, expired)
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, namespace, checkpoint_id) for checkpoint_id in expired],
+            )
+            deleted_checkpoints += len(expired)
+
+        deleted_writes = self._conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND NOT EXISTS (SELECT 1 FROM checkpoints c "
+            "WHERE c.thread_id = writes.thread_id AND c.checkpoint_ns = writes.checkpoint_ns "
+            "AND c.checkpoint_id = writes.checkpoint_id)",
+            (thread_id,),
+        ).rowcount
+        if deltas:
+            self._conn.execute(
+                "DELETE FROM checkpoint_messages WHERE thread_id = ? AND NOT EXISTS (SELECT 1 FROM checkpoints c "
+                "WHERE c.thread_id = checkpoint_messages.thread_id AND c.checkpoint_ns = checkpoint_messages.checkpoint_ns "
+                "AND c.checkpoint_id = checkpoint_messages.checkpoint_id)",
+                (thread_id,),
+            )
+        return deleted_checkpoints, deleted_writes
+
+    def _delta_ancestors(self, thread_id: str, namespace: str, expired: set) -> set:
+        """
+        Checkpoints whose messages a surviving checkpoint is delta-encoded
+        against, all the way back to its snapshot (see MessageDeltas.py).
+        """
+        bases = dict(self._conn.execute(
+            "SELECT checkpoint_id, base_checkpoint_id FROM checkpoint_messages "
+            "WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, namespace),
+        ))
+        needed = set()
+        for checkpoint_id in bases:
+            if checkpoint_id in expired:
+                continue
+            base = bases[checkpoint_id]
+            while base is not None and base not in needed:
+                needed.add(base)
+                base = bases.get(base)
+        return needed
+
+    def run_once(self) -> dict:
+        """One full pass over every thread; returns what was removed."""
+        stats = {"threads": 0, "checkpoints": 0, "writes": 0, "pages_freed": 0, "started_at": time.time()}
+        if not self._tables_exist():
+            return stats
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        deltas = self._has_message_deltas()
+
+        last_thread = ""
+        while not self._stop.is_set():
+            threads = [
+                thread_id for (thread_id,) in self._conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints WHERE thread_id > ? ORDER BY thread_id LIMIT ?",
+                    (last_thread, self.threads_per_batch),
+                )
+            ]
+            if not threads:
+                break
+            with self._conn:
+                for thread_id in threads:
+                    checkpoints, writes = self._prune_thread(thread_id, cutoff, deltas)
+                    stats["checkpoints"] += checkpoints
+                    stats["writes"] += writes
+            stats["threads"] += len(threads)
+            last_thread = threads[-1]
+
+        # Without incremental auto_vacuum the freed pages are still reused by
+        # later writes; they just stay in the file.
+        if self._incremental_vacuum_enabled():
+            free_before = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion; execute() frees a single page.
+            self._conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+            stats["pages_freed"] = free_before - self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # TRUNCATE shrinks the WAL file back to zero when no reader holds it open.
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        stats["finished_at"] = time.time()
+        self.last_run = stats
+        return stats
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except sqlite3.Error as error:
+                # A busy database just means the next pass does the work.
+                self.last_run = {"error": str(error), "finished_at": time.time()}
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> "CheckpointRetention":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="checkpoint-retention", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="chatbot.db")
+    parser.add_argument("--keep-last", type=int, default=20)
+    parser.add_argument("--max-age-days", type=float)
+    args = parser.parse_args()
+
+    retention = CheckpointRetention(
+        args.db, keep_last=args.keep_last,
+        max_age_seconds=args.max_age_days * 86400 if args.max_age_days else None,
+        vacuum_pages=0,
+    )
+    retention.enable_incremental_vacuum()
+    print(retention.run_once())
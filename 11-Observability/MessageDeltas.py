@@ -0,0 +1,205 @@
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    Checkpoint, CheckpointMetadata, CheckpointTuple, ChannelVersions, get_checkpoint_metadata,
+)
+from langgraph.checkpoint.sqlite import SqliteSaver
+from collections import OrderedDict
+from typing import Iterator, Optional
+import json
+import threading
+
+MESSAGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint_messages (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    base_checkpoint_id TEXT,
+    keep INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    type TEXT,
+    tail BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+"""
+
+
+def _common_prefix(old: list, new: list) -> int:
+    """How many leading messages the add_messages reducer left untouched."""
+    limit = min(len(old), len(new))
+    index = 0
+    while index < limit:
+        before, after = old[index], new[index]
+        if before is not after and (getattr(before, "id", None) != getattr(after, "id", None) or before != after):
+            break
+        index += 1
+    return index
+
+
+class MessageDeltaSaver(SqliteSaver):
+    """
+    SqliteSaver that stores the ``messages`` channel as a delta against the
+    parent checkpoint instead of the whole list.
+
+    add_messages only appends, or replaces/removes a few messages, so each
+    checkpoint keeps the length of the prefix it shares with its parent plus
+    the messages after it, in the ``checkpoint_messages`` table. Every
+    ``snapshot_every`` steps the full list is written again, which bounds how
+    many rows a read has to replay. Reads rebuild the list, so callers see
+    ordinary checkpoints. Checkpoints written before the table existed keep
+    their messages inline and read back unchanged.
+    """
+
+    channel = "messages"
+
+    def __init__(self, *args, snapshot_every: int = 32, cache_size: int = 256, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.snapshot_every = max(1, snapshot_every)
+        self.cache_size = cache_size
+        # (thread_id, checkpoint_ns, checkpoint_id) -> (messages, depth); the
+        # latest checkpoint of an active thread is nearly always here.
+        self._rebuilt: OrderedDict = OrderedDict()
+        self._rebuilt_lock = threading.Lock()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(MESSAGES_SCHEMA)
+        self.conn.commit()
+
+    def _remember(self, key: tuple, messages: list, depth: int):
+        with self._rebuilt_lock:
+            self._rebuilt[key] = (messages, depth)
+            self._rebuilt.move_to_end(key)
+            while len(self._rebuilt) > self.cache_size:
+                self._rebuilt.popitem(last=False)
+
+    def _cached(self, key: tuple) -> Optional[tuple[list, int]]:
+        with self._rebuilt_lock:
+            found = self._rebuilt.get(key)
+            if found is not None:
+                self._rebuilt.move_to_end(key)
+            return found
+
+    def _messages(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, cur=None
+    ) -> Optional[tuple[list, int]]:
+        """
+        (messages, depth) at a checkpoint, or None if it has no delta row.
+        Pass cur when already holding the connection lock (e.g. from setup()).
+        """
+        key = (thread_id, checkpoint_ns, checkpoint_id)
+        found = self._cached(key)
+        if found is not None:
+            return found
+        if cur is None:
+            with self.cursor(transaction=False) as cur:
+                return self._messages(thread_id, checkpoint_ns, checkpoint_id, cur)
+
+        # Walk back to a snapshot (or a cached ancestor), then replay forwards.
+        pending, current = [], checkpoint_id
+        while True:
+            row = cur.execute(
+                "SELECT base_checkpoint_id, keep, depth, type, tail FROM checkpoint_messages "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, current),
+            ).fetchone()
+            if row is None:
+                # Broken chain: the ancestor was pruned or predates deltas.
+                return None
+            pending.append((current, row))
+            base_id = row[0]
+            if base_id is None:
+                messages, depth = [], -1
+                break
+            found = self._cached((thread_id, checkpoint_ns, base_id))
+            if found is not None:
+                messages, depth = found
+                break
+            current = base_id
+
+        for current, (_, keep, depth, type_, tail) in reversed(pending):
+            messages = messages[:keep] + self.serde.loads_typed((type_, tail))
+            self._remember((thread_id, checkpoint_ns, current), messages, depth)
+        return messages, depth
+
+    def _restore(self, saved: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        if saved is None or self.channel in saved.checkpoint["channel_values"]:
+            return saved
+        configurable = saved.config["configurable"]
+        found = self._messages(
+            str(configurable["thread_id"]), configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"]
+        )
+        if found is not None:
+            saved.checkpoint["channel_values"][self.channel] = list(found[0])
+        return saved
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._restore(super().get_tuple(config))
+
+    def list(self, config: Optional[RunnableConfig], **kwargs) -> Iterator[CheckpointTuple]:
+        # SqliteSaver.list holds the connection lock while it yields, and
+        # rebuilding needs it too, so read the page first.
+        for saved in [*super().list(config, **kwargs)]:
+            yield self._restore(saved)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        messages = checkpoint["channel_values"].get(self.channel)
+        if not isinstance(messages, list):
+            return super().put(config, checkpoint, metadata, new_versions)
+        self.setup()
+
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        parent = self._messages(thread_id, checkpoint_ns, parent_id) if parent_id else None
+
+        base_id, keep, depth = None, 0, 0
+        if parent is not None and parent[1] + 1 < self.snapshot_every:
+            keep = _common_prefix(parent[0], messages)
+            if keep:
+                base_id, depth = parent_id, parent[1] + 1
+
+        # Both rows go in one transaction, so retention never sees a delta row
+        # without its checkpoint (or a checkpoint without its messages).
+        type_, tail = self.serde.dumps_typed(messages[keep:])
+        values = {name: value for name, value in checkpoint["channel_values"].items() if name != self.channel}
+        checkpoint_type, serialized_checkpoint = self.serde.dumps_typed({**checkpoint, "channel_values": values})
+        serialized_metadata = json.dumps(
+            get_checkpoint_metadata(config, metadata), ensure_ascii=False
+        ).encode("utf-8", "ignore")
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoint_messages "
+                "(thread_id, checkpoint_ns, checkpoint_id, base_checkpoint_id, keep, depth, type, tail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], base_id, keep, depth, type_, tail),
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id, checkpoint_type, serialized_checkpoint, serialized_metadata),
+            )
+        self._remember((thread_id, checkpoint_ns, checkpoint["id"]), list(messages), depth)
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM checkpoint_messages WHERE thread_id = ?", (str(thread_id),))
+        with self._rebuilt_lock:
+            for key in [key for key in self._rebuilt if key[0] == str(thread_id)]:
+                del self._rebuilt[key]
@@ -1,7 +1,9 @@
 import streamlit as st
-from Backend import graph as chatbot, HumanMessage, AIMessage, ToolMessage,  listThreads
+from Backend import graph as chatbot, HumanMessage, AIMessage, ToolMessage,  listThreadsPage
 import uuid
 
+THREADS_PER_PAGE = 20
+
 def generate_thread_id():
     return uuid.uuid4()
 
@@ -9,11 +11,6 @@ def reset_chat():
     st.session_state.message_history = []
     thread_id = generate_thread_id()
     st.session_state.thread_id = thread_id
-    add_thread(thread_id)
-
-def add_thread(thread_id):
-    if thread_id not in st.session_state.conversation_threads:
-        st.session_state.conversation_threads.append(thread_id)
 
 def load_conversation(thread_id): 
     state = chatbot.get_state(config={'configurable': {'thread_id': thread_id}})
@@ -25,10 +22,9 @@ if 'message_history' not in st.session_state:
 if 'thread_id' not in st.session_state:
     st.session_state.thread_id = generate_thread_id()
 
-if 'conversation_threads' not in st.session_state:
-    st.session_state.conversation_threads = listThreads()
-
-add_thread(st.session_state.thread_id)
+if 'thread_cursors' not in st.session_state:
+    # Cursors of the pages visited so far; the last one is the page on screen.
+    st.session_state.thread_cursors = [None]
 
 st.sidebar.title("Resume Chatbot")
 if st.sidebar.button("New Conversation"):
@@ -36,8 +32,18 @@ if st.sidebar.button("New Conversation"):
 
 st.sidebar.header("Conversations")
 
-for thread_id in st.session_state.conversation_threads[::-1]:
-    if st.sidebar.button(str(thread_id)):
+search = st.sidebar.text_input("Search conversations")
+if st.session_state.get('thread_search') != search:
+    st.session_state.thread_search = search
+    st.session_state.thread_cursors = [None]
+
+# Only the visible page is fetched, so a rerun costs the same however many
+# conversations exist.
+threads, next_cursor = listThreadsPage(THREADS_PER_PAGE, st.session_state.thread_cursors[-1], search or None)
+
+for thread in threads:
+    thread_id = thread['thread_id']
+    if st.sidebar.button(thread_id, help=f"{thread['message_count'] or 0} messages"):
         st.session_state.thread_id = thread_id
         messages = load_conversation(thread_id)
         temp_messages = []
@@ -48,6 +54,14 @@ for thread_id in st.session_state.conversation_threads[::-1]:
                 temp_messages.append({"role": "assistant", "content": message.content})
         st.session_state.message_history = temp_messages
 
+newer, older = st.sidebar.columns(2)
+if len(st.session_state.thread_cursors) > 1 and newer.button("Newer"):
+    st.session_state.thread_cursors.pop()
+    st.rerun()
+if next_cursor and older.button("Older"):
+    st.session_state.thread_cursors.append(next_cursor)
+    st.rerun()
+
 for message in st.session_state.message_history:
     if message["role"] == "user":
         with st.chat_message("user"):
@@ -2,7 +2,9 @@ from langgraph.graph import StateGraph, START, END
 from typing import TypedDict, Annotated
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_groq import ChatGroq
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from ThreadRegistry import RegisteredAsyncSqliteSaver
+from CheckpointRetention import CheckpointRetention
+from CheckpointCompression import CompressedSerializer
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_community.tools import DuckDuckGoSearchRun
@@ -10,6 +12,7 @@ from langchain_core.tools import tool, BaseTool
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from dotenv import load_dotenv
 import aiosqlite
+import os
 import requests
 import asyncio
 import threading
@@ -89,9 +92,37 @@ async def chat_node(state: ChatBotState):
 tool_node = ToolNode(tools) if tools else None
 
 
+# Prune old checkpoints in the background so chatbot.db stays proportional to
+# the live conversations: keep the last CHECKPOINT_KEEP_LAST per thread, or every
+# checkpoint younger than CHECKPOINT_MAX_AGE_DAYS when that is set (0 disables
+# the age window). CHECKPOINT_KEEP_LAST=0 turns retention off. It is set up
+# before anything else opens chatbot.db, so a new database gets incremental
+# auto_vacuum before its first table exists.
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("CHECKPOINT_MAX_AGE_DAYS", "0"))
+CHECKPOINT_RETENTION_INTERVAL = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "300"))
+
+checkpoint_retention = CheckpointRetention(
+    'chatbot.db',
+    keep_last=CHECKPOINT_KEEP_LAST,
+    max_age_seconds=CHECKPOINT_MAX_AGE_DAYS * 86400 or None,
+    interval_seconds=CHECKPOINT_RETENTION_INTERVAL,
+)
+if CHECKPOINT_KEEP_LAST > 0:
+    checkpoint_retention.start()
+
+# Checkpoint and pending-write blobs are compressed with CHECKPOINT_COMPRESSION
+# ("zlib", "zstd" or "none"); rows written before stay readable either way.
+# CheckpointCompression.py trains a dictionary and recompresses existing rows.
+CHECKPOINT_COMPRESSION = os.getenv("CHECKPOINT_COMPRESSION", "zlib")
+checkpoint_serde = CompressedSerializer(
+    None if CHECKPOINT_COMPRESSION == "none" else CHECKPOINT_COMPRESSION, path='chatbot.db'
+)
+
+
 async def _init_checkpointer():
     conn = await aiosqlite.connect(database="chatbot.db")
-    return AsyncSqliteSaver(conn)
+    return RegisteredAsyncSqliteSaver(conn, serde=checkpoint_serde)
 
 
 checkpointer = run_async(_init_checkpointer())
@@ -111,11 +142,13 @@ else:
 chatbot = graph.compile(checkpointer=checkpointer)
 
 async def _alist_threads():
-    all_threads = set()
-    async for checkpoint in checkpointer.alist(None):
-        all_threads.add(checkpoint.config["configurable"]["thread_id"])
-    return list(all_threads)
+    return await checkpointer.alist_threads()
 
 
 def listThreads():
-    return run_async(_alist_threads())
\ No newline at end of file
+    return run_async(_alist_threads())
+
+
+def listThreadsPage(limit=20, cursor=None, search=None):
+    """One page of threads, most recently active first, and the cursor of the next page."""
+    return run_async(checkpointer.athreads_page(limit=limit, cursor=cursor, search=search))
\ No newline at end of file
@@ -2,7 +2,9 @@ import queue
 import uuid
 
 import streamlit as st
-from Backend import chatbot, listThreads, submit_async_task, AIMessage, HumanMessage, ToolMessage
+from Backend import chatbot, listThreadsPage, submit_async_task, AIMessage, HumanMessage, ToolMessage
+
+THREADS_PER_PAGE = 20
 
 def generate_thread_id():
     return uuid.uuid4()
@@ -11,15 +13,9 @@ def generate_thread_id():
 def reset_chat():
     thread_id = generate_thread_id()
     st.session_state["thread_id"] = thread_id
-    add_thread(thread_id)
     st.session_state["message_history"] = []
 
 
-def add_thread(thread_id):
-    if thread_id not in st.session_state["chat_threads"]:
-        st.session_state["chat_threads"].append(thread_id)
-
-
 def load_conversation(thread_id):
     state = chatbot.get_state(config={"configurable": {"thread_id": thread_id}})
     return state.values.get("messages", [])
@@ -31,10 +27,9 @@ if "message_history" not in st.session_state:
 if "thread_id" not in st.session_state:
     st.session_state["thread_id"] = generate_thread_id()
 
-if "chat_threads" not in st.session_state:
-    st.session_state["chat_threads"] = listThreads()
-
-add_thread(st.session_state["thread_id"])
+if "thread_cursors" not in st.session_state:
+    # Cursors of the pages visited so far; the last one is the page on screen.
+    st.session_state["thread_cursors"] = [None]
 
 st.sidebar.title("LangGraph MCP Chatbot")
 
@@ -42,8 +37,19 @@ if st.sidebar.button("New Chat"):
     reset_chat()
 
 st.sidebar.header("My Conversations")
-for thread_id in st.session_state["chat_threads"][::-1]:
-    if st.sidebar.button(str(thread_id)):
+
+search = st.sidebar.text_input("Search conversations")
+if st.session_state.get("thread_search") != search:
+    st.session_state["thread_search"] = search
+    st.session_state["thread_cursors"] = [None]
+
+# Only the visible page is fetched, so a rerun costs the same however many
+# conversations exist.
+threads, next_cursor = listThreadsPage(THREADS_PER_PAGE, st.session_state["thread_cursors"][-1], search or None)
+
+for thread in threads:
+    thread_id = thread["thread_id"]
+    if st.sidebar.button(thread_id, help=f"{thread['message_count'] or 0} messages"):
         st.session_state["thread_id"] = thread_id
         messages = load_conversation(thread_id)
 
@@ -53,6 +59,14 @@ for thread_id in st.session_state["chat_threads"][::-1]:
             temp_messages.append({"role": role, "content": msg.content})
         st.session_state["message_history"] = temp_messages
 
+newer, older = st.sidebar.columns(2)
+if len(st.session_state["thread_cursors"]) > 1 and newer.button("Newer"):
+    st.session_state["thread_cursors"].pop()
+    st.rerun()
+if next_cursor and older.button("Older"):
+    st.session_state["thread_cursors"].append(next_cursor)
+    st.rerun()
+
 
 for message in st.session_state["message_history"]:
     with st.chat_message(message["role"]):
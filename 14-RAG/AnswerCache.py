@@ -0,0 +1,129 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any, Iterator, List, Optional, Sequence
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from RetrievalCache import normalize_query
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not make a different question."""
+    return normalize_query(question).strip(" ?!.")
+
+
+def documents_key(doc_ids: Sequence[str]) -> str:
+    """doc_ids are content hashes, so this identifies exactly which document versions were searched."""
+    return hashlib.sha256("|".join(sorted(doc_ids)).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Persistent cache of final answers to document questions.
+
+    Entries are keyed by the documents a thread searches plus the normalized
+    question, and remember the chunk IDs the answer was grounded on, so the
+    caller can check those chunks still exist before serving it.
+    """
+
+    def __init__(self, path: str = "answer_cache.db", ttl_seconds: float = 7 * 24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS answers (
+                    documents_key TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    doc_ids TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    chunk_ids TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (documents_key, question)
+                );
+                """
+            )
+
+    def get(self, doc_ids: Sequence[str], question: str) -> Optional[tuple[str, List[str]]]:
+        """(answer, chunk_ids) for the question, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, chunk_ids FROM answers WHERE documents_key = ? AND question = ? AND created_at > ?",
+                (documents_key(doc_ids), normalize_question(question), time.time() - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, doc_ids: Sequence[str], question: str, answer: str, chunk_ids: Sequence[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (documents_key, question, doc_ids, answer, chunk_ids, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    documents_key(doc_ids), normalize_question(question), " ".join(sorted(doc_ids)),
+                    answer, json.dumps(list(chunk_ids)), time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def discard(self, doc_ids: Sequence[str], question: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM answers WHERE documents_key = ? AND question = ?",
+                (documents_key(doc_ids), normalize_question(question)),
+            )
+            self._conn.commit()
+
+    def invalidate_document(self, doc_id: str):
+        """Drop every answer that searched doc_id."""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE ' ' || doc_ids || ' ' LIKE ?", (f"% {doc_id} %",))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+class CachedAnswerModel(BaseChatModel):
+    """
+    Replays a cached answer as if a chat model produced it.
+
+    Invoking it inside a graph node streams the answer word by word to
+    stream_mode="messages" consumers, exactly like a live model response.
+    """
+
+    answer: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "cached-answer"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for piece in re.findall(r"\S+\s*|\s+", self.answer):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
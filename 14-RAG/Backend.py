@@ -1,12 +1,14 @@
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated, Optional, Dict, Any
+from typing import TypedDict, Annotated, Optional, Dict, Any, Callable, Iterable
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_groq import ChatGroq
 from langgraph.graph.message import add_messages 
 from dotenv import load_dotenv
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_chroma import Chroma
-from langgraph.checkpoint.sqlite import SqliteSaver
+from ThreadRegistry import RegisteredSqliteSaver
+from CheckpointRetention import CheckpointRetention
+from CheckpointCompression import CompressedSerializer
 import sqlite3
 
 from langgraph.prebuilt import ToolNode, tools_condition
@@ -14,15 +16,35 @@ from langchain_core.tools import tool
 from langchain_community.tools import DuckDuckGoSearchRun
 import requests
 
-import tempfile
+import io
+import uuid
+import bisect
+import hashlib
+import json
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+from pypdf import PdfReader
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_chroma import Chroma
 from dotenv import load_dotenv
 import os
 
+from EmbeddingCache import SQLiteEmbeddingCache
+from HybridSearch import BM25Index, HybridRetriever
+from NumpyVectorStore import NumpyVectorStore
+from IVFIndex import IVFIndex
+from PCAProjection import PCAProjection
+from RetrievalCache import RetrievalCache
+from ContextPacker import pack_context
+from AnswerCache import AnswerCache, CachedAnswerModel
+from PdfExtraction import SPLITTER_OPTIONS, iter_split_pages, make_splitter, page_document
+
 load_dotenv()
 
 
@@ -33,75 +55,804 @@ model = ChatGroq(
     reasoning_format='parsed'
 )
 
-embedding_model = HuggingFaceEndpointEmbeddings(
-    model="BAAI/bge-large-en-v1.5",
-)
+EMBEDDING_MODEL_NAME = "BAAI/bge-large-en-v1.5"
 
-vector_store = Chroma(
-    persist_directory='./chroma_db',
-    collection_name='my_documents',
-    embedding_function=embedding_model,
+embedding_model = SQLiteEmbeddingCache(
+    HuggingFaceEndpointEmbeddings(
+        model=EMBEDDING_MODEL_NAME,
+    ),
+    model_name=EMBEDDING_MODEL_NAME,
+    path='embedding_cache.db',
 )
 
+# "chroma" (default) or "numpy" for the embedded memory-mapped store, which
+# suits offline tests and small single-node deployments.
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+
+# VECTOR_INDEX=ivf puts an approximate IVF index in front of the NumPy store.
+# IVF_NPROBE is the recall/latency knob; run IVFIndex.py for a recall@k report.
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+
+# VECTOR_QUANTIZATION=int8 searches int8 copies of the NumPy store's vectors and
+# rescores the best QUANTIZED_RESCORE_FACTOR * k rows at full precision. Run
+# NumpyVectorStore.py for a recall@k report before switching it on.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "8"))
+
+# VECTOR_PROJECTION_DIM=256 searches a PCA projection of the NumPy store fitted
+# on the collection (refitted as it grows), rescoring the best candidates at
+# full dimension. Run PCAProjection.py for the recall trade-off; 0 disables it.
+VECTOR_PROJECTION_DIM = int(os.getenv("VECTOR_PROJECTION_DIM", "0"))
+
+if VECTOR_STORE_BACKEND == "numpy":
+    vector_store = NumpyVectorStore(
+        persist_directory='./numpy_store',
+        embedding_function=embedding_model,
+        ivf=IVFIndex('./numpy_store', nlist=IVF_NLIST, nprobe=IVF_NPROBE) if VECTOR_INDEX == "ivf" else None,
+        quantize=VECTOR_QUANTIZATION == "int8",
+        rescore_factor=QUANTIZED_RESCORE_FACTOR,
+        projection=PCAProjection('./numpy_store', dimension=VECTOR_PROJECTION_DIM) if VECTOR_PROJECTION_DIM else None,
+    )
+else:
+    vector_store = Chroma(
+        persist_directory='./chroma_db',
+        collection_name='my_documents',
+        embedding_function=embedding_model,
+    )
+
+# Keyword index kept alongside ./chroma_db so exact identifiers (tickers,
+# clause numbers, part codes) are found even when dense similarity misses them.
+bm25_index = BM25Index('./bm25_index.db')
+
+# Repeated questions (and duplicate tool calls within one turn) are answered
+# from memory until the thread's documents or the collection change.
+retrieval_cache = RetrievalCache(max_entries=1024, ttl_seconds=600)
+
+# Final answers to document questions, keyed by the versions of the documents
+# a thread searches plus the normalized question. A hit skips both model calls
+# and the retrieval in between.
+answer_cache = AnswerCache('./answer_cache.db')
+
 _THREAD_RETRIEVERS: Dict[str, Any] = {}
 _THREAD_METADATA: Dict[str, dict] = {}
 
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+CHUNK_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# Embedding requests are sent in batches on a shared pool, so the number of
+# in-flight calls to the endpoint stays bounded across every upload.
+EMBED_BATCH_SIZE = 64
+EMBED_CONCURRENCY = 4
+EMBED_MAX_RETRIES = 3
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+
+# Text extraction and splitting are CPU-bound, so large PDFs are sharded across
+# a process pool, one worker per CPU by default (never more than the PDF has
+# pages). PDF_EXTRACT_WORKERS=1 keeps everything in-process.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = 32
+_EXTRACT_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXTRACT_EXECUTOR_LOCK = threading.Lock()
+
+# Token budget for the retrieved context handed back to the model per tool call.
+RAG_CONTEXT_TOKENS = 1500
+
+# Retrieval shape per tool: the best fetch_k fused chunks are re-ranked by
+# maximal marginal relevance and k are kept. lambda_mult=1.0 is pure relevance,
+# lower values trade relevance for diversity; None turns MMR off.
+RAG_RETRIEVAL = {"k": 4, "fetch_k": 20, "lambda_mult": 0.5}
+SEARCH_DOCS_RETRIEVAL = {"k": 3, "fetch_k": 20, "lambda_mult": 0.5}
+
+
+def _retrieval_key(config: dict) -> str:
+    """search_type for the retrieval cache, so changing the MMR settings never serves stale results."""
+    return f"hybrid:fetch_k={config['fetch_k']}:lambda={config['lambda_mult']}"
+
+# Content-addressed registry of every PDF that has been embedded into the
+# collection, so identical uploads reuse the existing chunks instead of paying
+# for the embedding endpoint again.
+registry_conn = sqlite3.connect('rag_registry.db', check_same_thread=False)
+_REGISTRY_LOCK = threading.Lock()
+
+with _REGISTRY_LOCK:
+    registry_conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            doc_id TEXT PRIMARY KEY,
+            file_hash TEXT NOT NULL,
+            filename TEXT,
+            pages INTEGER NOT NULL,
+            chunk_ids TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS thread_documents (
+            thread_id TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            filename TEXT,
+            attached_at REAL NOT NULL,
+            PRIMARY KEY (thread_id, doc_id)
+        );
+        """
+    )
+    # Columns added for incremental re-indexing; older registries get them here.
+    columns = {row[1] for row in registry_conn.execute("PRAGMA table_info(documents)")}
+    if "lineage_id" not in columns:
+        registry_conn.execute("ALTER TABLE documents ADD COLUMN lineage_id TEXT")
+    if "page_chunks" not in columns:
+        registry_conn.execute("ALTER TABLE documents ADD COLUMN page_chunks TEXT")
+    if "superseded_by" not in columns:
+        registry_conn.execute("ALTER TABLE documents ADD COLUMN superseded_by TEXT")
+    registry_conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            job_id TEXT PRIMARY KEY,
+            thread_id TEXT NOT NULL,
+            filename TEXT,
+            file_hash TEXT NOT NULL,
+            upload_path TEXT NOT NULL,
+            status TEXT NOT NULL,
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            pages_total INTEGER,
+            summary TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ingest_jobs_thread ON ingest_jobs (thread_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status);
+        """
+    )
+    registry_conn.commit()
+
+
+def _splitter_settings() -> dict:
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "separators": CHUNK_SEPARATORS,
+        **SPLITTER_OPTIONS,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+    }
+
+
+def _document_id(file_bytes: bytes) -> tuple[str, str]:
+    """Return (doc_id, file_hash) for the upload under the current splitter settings."""
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    settings = json.dumps(_splitter_settings(), sort_keys=True)
+    doc_id = hashlib.sha256(f"{file_hash}:{settings}".encode("utf-8")).hexdigest()
+    return doc_id, file_hash
+
+
+def _lookup_document(doc_id: str) -> Optional[dict]:
+    with _REGISTRY_LOCK:
+        row = registry_conn.execute(
+            "SELECT filename, pages, chunk_ids FROM documents WHERE doc_id = ? AND superseded_by IS NULL",
+            (doc_id,),
+        ).fetchone()
+    if row is None:
+        return None
+    chunk_ids = json.loads(row[2])
+    # The registry can outlive the vector store (e.g. its directory was wiped), so
+    # make sure the chunks are still there before trusting the entry.
+    if chunk_ids and not vector_store.get_by_ids(chunk_ids[:1]):
+        return None
+    return {"filename": row[0], "pages": row[1], "chunk_ids": chunk_ids}
+
+
+def _register_document(
+    doc_id: str,
+    file_hash: str,
+    filename: Optional[str],
+    pages: int,
+    chunk_ids: list[str],
+    lineage_id: Optional[str] = None,
+    page_chunks: Optional[list] = None,
+):
+    with _REGISTRY_LOCK:
+        registry_conn.execute(
+            "INSERT OR REPLACE INTO documents "
+            "(doc_id, file_hash, filename, pages, chunk_ids, created_at, lineage_id, page_chunks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                doc_id, file_hash, filename, pages, json.dumps(chunk_ids), time.time(),
+                lineage_id or doc_id, json.dumps(page_chunks) if page_chunks is not None else None,
+            ),
+        )
+        registry_conn.commit()
+
+
+def _supersede_document(doc_id: str, successor_id: str):
+    """Retire a version whose surviving chunks were handed over to its successor."""
+    with _REGISTRY_LOCK:
+        registry_conn.execute(
+            "UPDATE documents SET superseded_by = ? WHERE doc_id = ?", (successor_id, doc_id)
+        )
+        registry_conn.commit()
+    answer_cache.invalidate_document(doc_id)
+
+
+def _was_superseded(doc_id: str) -> bool:
+    with _REGISTRY_LOCK:
+        row = registry_conn.execute(
+            "SELECT superseded_by FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+    return row is not None and row[0] is not None
+
+
+def _attach_document(thread_id: str, doc_id: str, filename: Optional[str]):
+    with _REGISTRY_LOCK:
+        registry_conn.execute(
+            "INSERT OR REPLACE INTO thread_documents (thread_id, doc_id, filename, attached_at) "
+            "VALUES (?, ?, ?, ?)",
+            (thread_id, doc_id, filename, time.time()),
+        )
+        registry_conn.commit()
+
+
+def _detach_document(thread_id: str, doc_id: str):
+    with _REGISTRY_LOCK:
+        registry_conn.execute(
+            "DELETE FROM thread_documents WHERE thread_id = ? AND doc_id = ?", (thread_id, doc_id)
+        )
+        registry_conn.commit()
+
+
+def _previous_version(thread_id: str, filename: str) -> Optional[dict]:
+    """
+    The document most recently attached to the thread under the same filename.
+
+    ``incremental`` is True when that version can be revised in place: it has
+    per-page chunk records and no other thread is using it.
+    """
+    with _REGISTRY_LOCK:
+        row = registry_conn.execute(
+            "SELECT d.doc_id, d.lineage_id, d.page_chunks, "
+            "(SELECT COUNT(*) FROM thread_documents o WHERE o.doc_id = d.doc_id AND o.thread_id != ?) "
+            "FROM thread_documents t JOIN documents d ON d.doc_id = t.doc_id "
+            "WHERE t.thread_id = ? AND t.filename = ? AND d.superseded_by IS NULL "
+            "ORDER BY t.attached_at DESC LIMIT 1",
+            (thread_id, thread_id, filename),
+        ).fetchone()
+    if row is None:
+        return None
+    doc_id, lineage_id, page_chunks, other_threads = row
+    return {
+        "doc_id": doc_id,
+        "lineage_id": lineage_id or doc_id,
+        "page_chunks": json.loads(page_chunks) if page_chunks else None,
+        "incremental": bool(page_chunks) and other_threads == 0,
+    }
+
+
+def _thread_documents(thread_id: str) -> list[tuple[str, Optional[str]]]:
+    """Return (doc_id, filename) pairs attached to the thread, oldest first."""
+    with _REGISTRY_LOCK:
+        return registry_conn.execute(
+            "SELECT doc_id, filename FROM thread_documents WHERE thread_id = ? ORDER BY attached_at",
+            (thread_id,),
+        ).fetchall()
+
+
+def _load_thread(thread_id: Optional[str]) -> bool:
+    """
+    Make sure the thread's retriever and metadata are cached in this process.
+
+    After a restart the in-memory registry is empty, so it is rebuilt lazily from
+    the persisted thread/document table on first access. Documents whose chunks
+    are no longer in Chroma are skipped.
+    """
+    if not thread_id:
+        return False
+    thread_id = str(thread_id)
+    if thread_id in _THREAD_RETRIEVERS:
+        return True
+
+    doc_ids = []
+    summary = None
+    for doc_id, filename in _thread_documents(thread_id):
+        document = _lookup_document(doc_id)
+        if document is None:
+            continue
+        doc_ids.append(doc_id)
+        summary = {
+            "filename": filename or document["filename"],
+            "documents": document["pages"],
+            "chunks": len(document["chunk_ids"]),
+            "doc_id": doc_id,
+            "reused": True,
+        }
+    if not doc_ids:
+        return False
+
+    # Chunks are shared between threads after deduplication, so the thread is
+    # scoped by the doc_id tag on each chunk rather than a per-chunk thread tag.
+    _THREAD_RETRIEVERS[thread_id] = HybridRetriever(
+        vector_store=vector_store, bm25=bm25_index, doc_ids=doc_ids, **RAG_RETRIEVAL
+    )
+    _THREAD_METADATA[thread_id] = summary
+    return True
+
 
 def _get_retriever(thread_id: Optional[str]):
     """Fetch the retriever for a thread if available."""
-    if thread_id and thread_id in _THREAD_RETRIEVERS:
-        return _THREAD_RETRIEVERS[thread_id]
+    if _load_thread(thread_id):
+        return _THREAD_RETRIEVERS[str(thread_id)]
     return None
 
-def ingest_pdf(file_bytes: bytes, thread_id: str, filename: Optional[str] = None) -> dict:
+def _attach_retriever(thread_id: str, summary: dict):
+    retrieval_cache.invalidate(thread_id)
+    _THREAD_RETRIEVERS.pop(thread_id, None)
+    _load_thread(thread_id)
+    _THREAD_METADATA[thread_id] = summary
+
+
+def _iter_pdf_pages(reader: PdfReader, source: str) -> Iterable[Document]:
+    """Yield one Document per page, extracting text lazily from the in-memory PDF."""
+    for index in range(len(reader.pages)):
+        yield page_document(reader, index, source)
+
+
+def _make_splitter() -> RecursiveCharacterTextSplitter:
+    return make_splitter(CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_SEPARATORS)
+
+
+def _extract_executor() -> ProcessPoolExecutor:
+    global _EXTRACT_EXECUTOR
+    with _EXTRACT_EXECUTOR_LOCK:
+        if _EXTRACT_EXECUTOR is None:
+            # Spawned rather than forked: this process holds threads and open
+            # SQLite connections that must not be copied into the workers.
+            _EXTRACT_EXECUTOR = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _EXTRACT_EXECUTOR
+
+
+def _iter_split_pages(reader: PdfReader, file_bytes: bytes, source: str) -> Iterable[tuple[Document, Optional[list]]]:
+    """
+    Yield (page, chunks) in page order. Large PDFs are extracted and split on
+    the process pool; otherwise pages are extracted here and chunks is None, so
+    the caller only splits the pages it actually needs.
+    """
+    page_count = len(reader.pages)
+    workers = min(PDF_EXTRACT_WORKERS, page_count)
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        yield from iter_split_pages(
+            _extract_executor(), file_bytes, source, page_count,
+            CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_SEPARATORS,
+            shards=min(4 * workers, page_count), in_flight=2 * workers,
+        )
+    else:
+        for page in _iter_pdf_pages(reader, source):
+            yield page, None
+
+
+def _retag_chunks(page_of_chunk: Dict[str, int], doc_id: str, total_pages: int):
+    """Point kept chunks at the new document version without re-embedding them."""
+    chunk_ids = list(page_of_chunk)
+    for start in range(0, len(chunk_ids), 500):
+        docs = vector_store.get_by_ids(chunk_ids[start:start + 500])
+        ids = [doc.id for doc in docs]
+        metadatas = [
+            {**doc.metadata, "doc_id": doc_id, "page": page_of_chunk[doc.id], "total_pages": total_pages}
+            for doc in docs
+        ]
+        if not ids:
+            continue
+        if isinstance(vector_store, NumpyVectorStore):
+            vector_store.update_metadata(ids, metadatas)
+        else:
+            vector_store._collection.update(ids=ids, metadatas=metadatas)
+        bm25_index.retag(ids, doc_id)
+
+
+def _delete_chunks(chunk_ids: list[str]):
+    for start in range(0, len(chunk_ids), 500):
+        vector_store.delete(ids=chunk_ids[start:start + 500])
+    bm25_index.delete(chunk_ids)
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    """Embed one batch, retrying it on its own with exponential backoff."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            return embedding_model.embed_documents(texts)
+        except Exception:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _upsert_batch(batch: list[tuple[str, Document]], vectors: list[list[float]]):
+    ids = [chunk_id for chunk_id, _ in batch]
+    metadatas = [chunk.metadata for _, chunk in batch]
+    texts = [chunk.page_content for _, chunk in batch]
+    if isinstance(vector_store, NumpyVectorStore):
+        vector_store.upsert_embeddings(ids, vectors, texts, metadatas)
+    else:
+        vector_store._collection.upsert(
+            ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts
+        )
+    bm25_index.add(batch)
+
+
+def _embed_and_upsert(
+    chunks: Iterable[tuple[str, Document]],
+    total: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> int:
+    """
+    Embed (chunk_id, chunk) pairs in batches on the shared pool and upsert each
+    batch into Chroma as soon as it finishes.
+
+    At most 2 * EMBED_CONCURRENCY batches are held in memory at once, so the
+    input can be a lazy generator. progress_callback(stored, total) reports
+    how many leading chunks of the input are stored; batches finish out of
+    order, so a batch only counts once every earlier one is stored too.
+    Returns the number of chunks written.
+    """
+    pending = {}
+    finished: Dict[int, int] = {}
+    written = 0
+    stored = 0
+    next_batch = 0
+
+    def drain(block_until: int):
+        nonlocal written, stored, next_batch
+        while len(pending) > block_until:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, batch = pending.pop(future)
+                _upsert_batch(batch, future.result())
+                written += len(batch)
+                finished[number] = len(batch)
+            advanced = False
+            while next_batch in finished:
+                stored += finished.pop(next_batch)
+                next_batch += 1
+                advanced = True
+            if advanced and progress_callback is not None:
+                progress_callback(stored, total)
+
+    def submit(batch: list, number: int):
+        pending[_EMBED_EXECUTOR.submit(_embed_batch, [c.page_content for _, c in batch])] = (number, batch)
+
+    try:
+        batch = []
+        submitted = 0
+        for item in chunks:
+            batch.append(item)
+            if len(batch) == EMBED_BATCH_SIZE:
+                submit(batch, submitted)
+                submitted += 1
+                batch = []
+                drain(2 * EMBED_CONCURRENCY - 1)
+        if batch:
+            submit(batch, submitted)
+        drain(0)
+    finally:
+        for future in pending:
+            future.cancel()
+
+    return written
+
+
+_THREAD_INGEST_LOCKS: Dict[str, threading.Lock] = {}
+_THREAD_INGEST_LOCKS_GUARD = threading.Lock()
+
+
+def _thread_ingest_lock(thread_id: str) -> threading.Lock:
+    with _THREAD_INGEST_LOCKS_GUARD:
+        return _THREAD_INGEST_LOCKS.setdefault(thread_id, threading.Lock())
+
+
+def ingest_pdf(
+    file_bytes: bytes,
+    thread_id: str,
+    filename: Optional[str] = None,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> dict:
     """
-    Build a FAISS retriever for the uploaded PDF and store it for the thread.
+    Index the uploaded PDF into the shared Chroma collection and attach it to the thread.
+
+    Uploads are content-addressed: if the same bytes were already embedded with
+    the current splitter settings, the existing chunks are reused and no
+    embedding calls are made.
+
+    The PDF is read straight from memory page by page; each page is split as
+    it arrives and its chunks flow into the batched embedding stage, so peak
+    memory does not grow with the document. PDFs of PDF_PARALLEL_MIN_PAGES or
+    more are extracted and split on a process pool, in page order. progress_callback(pages_done,
+    pages_total) is called as pages become searchable, i.e. once every chunk
+    of the page and of the pages before it is embedded and stored.
+
+    Uploading a revised PDF under the same filename in the same thread replaces
+    the earlier version; when that version is not shared with other threads,
+    only the pages whose text changed are re-embedded.
+
+    Ingests into the same thread run one at a time, so two versions uploaded
+    back to back never both revise the version they replace.
 
     Returns a summary dict that can be surfaced in the UI.
     """
     if not file_bytes:
         raise ValueError("No bytes received for ingestion.")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-        temp_file.write(file_bytes)
-        temp_path = temp_file.name
+    thread_id = str(thread_id)
+    with _thread_ingest_lock(thread_id):
+        # The previous version is looked up under the lock, after any earlier
+        # ingest for this thread has attached its own.
+        return _ingest_pdf_locked(file_bytes, thread_id, filename, progress_callback)
 
-    try:
-        loader = PyPDFLoader(temp_path)
-        docs = loader.load()
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200, separators=["\n\n", "\n", " ", ""]
+def _ingest_pdf_locked(
+    file_bytes: bytes,
+    thread_id: str,
+    filename: Optional[str],
+    progress_callback: Optional[Callable[[int, Optional[int]], None]],
+) -> dict:
+    doc_id, file_hash = _document_id(file_bytes)
+    source = filename or f"{doc_id[:12]}.pdf"
+    previous = _previous_version(thread_id, source)
+    if previous is not None and previous["doc_id"] == doc_id:
+        previous = None
+
+    existing = _lookup_document(doc_id)
+    if existing is not None:
+        summary = {
+            "filename": source,
+            "documents": existing["pages"],
+            "chunks": len(existing["chunk_ids"]),
+            "doc_id": doc_id,
+            "file_hash": file_hash,
+            "reused": True,
+        }
+        if previous is not None:
+            _detach_document(thread_id, previous["doc_id"])
+            if previous["incremental"]:
+                # Nothing else uses the replaced version, and the reused
+                # document has chunks of its own, so retire it like the
+                # incremental path does rather than leave its chunks behind.
+                keep = set(existing["chunk_ids"])
+                stale = [
+                    chunk_id for _, ids in previous["page_chunks"] for chunk_id in ids if chunk_id not in keep
+                ]
+                if stale:
+                    _delete_chunks(stale)
+                _supersede_document(previous["doc_id"], doc_id)
+                retrieval_cache.invalidate(None)
+        _attach_document(thread_id, doc_id, summary["filename"])
+        _attach_retriever(thread_id, summary)
+        return summary
+
+    reader = PdfReader(io.BytesIO(file_bytes))
+    page_count = len(reader.pages)
+
+    # A revised upload with the same name in the same thread is indexed
+    # incrementally: chunks of unchanged pages keep their IDs and vectors, only
+    # new or changed pages are embedded, and chunks of removed pages are deleted.
+    lineage_id = doc_id
+    if _was_superseded(doc_id):
+        # Chunk IDs derived from this doc_id may still live on in a later
+        # version, so a fresh ingest of the same bytes needs its own prefix.
+        lineage_id = f"{doc_id}-{uuid.uuid4().hex[:8]}"
+    old_pages: Dict[str, list] = {}
+    if previous is not None and previous["incremental"]:
+        lineage_id = previous["lineage_id"]
+        old_pages = {page_key: ids for page_key, ids in previous["page_chunks"]}
+
+    splitter = _make_splitter()
+    page_chunks = []
+    kept: Dict[str, int] = {}
+    reused_pages = []
+    occurrences: Dict[str, int] = {}
+    # Number of new chunks yielded up to the end of each page, so progress
+    # can count the pages whose chunks are all stored.
+    page_ends: list[int] = []
+
+    def changed_chunks():
+        for page, split in _iter_split_pages(reader, file_bytes, source):
+            digest = hashlib.sha256(page.page_content.encode("utf-8")).hexdigest()[:16]
+            occurrences[digest] = occurrences.get(digest, 0) + 1
+            page_key = f"{digest}-{occurrences[digest]}"
+
+            if page_key in old_pages:
+                ids = old_pages.pop(page_key)
+                for chunk_id in ids:
+                    kept[chunk_id] = page.metadata["page"]
+                reused_pages.append(page_key)
+                page_chunks.append([page_key, ids])
+                page_ends.append(page_ends[-1] if page_ends else 0)
+                continue
+
+            ids = []
+            page_chunks.append([page_key, ids])
+            if split is None:
+                split = splitter.split_documents([page])
+            for index, chunk in enumerate(split):
+                chunk.metadata["doc_id"] = doc_id
+                chunk_id = f"{lineage_id}:{page_key}:{index}"
+                ids.append(chunk_id)
+                yield chunk_id, chunk
+            page_ends.append((page_ends[-1] if page_ends else 0) + len(ids))
+
+    def report_progress(stored: int, _total):
+        if progress_callback is not None:
+            progress_callback(bisect.bisect_right(page_ends, stored), page_count)
+
+    # Deterministic IDs make a concurrent duplicate upload (or a retry after a
+    # failed batch) an upsert rather than a second copy of every chunk.
+    _embed_and_upsert(changed_chunks(), progress_callback=report_progress)
+    if kept:
+        _retag_chunks(kept, doc_id, page_count)
+    stale = [chunk_id for ids in old_pages.values() for chunk_id in ids]
+    if stale:
+        _delete_chunks(stale)
+    retrieval_cache.invalidate(None)
+
+    chunk_ids = [chunk_id for _, ids in page_chunks for chunk_id in ids]
+    summary = {
+        "filename": source,
+        "documents": page_count,
+        "chunks": len(chunk_ids),
+        "doc_id": doc_id,
+        "file_hash": file_hash,
+        "reused": False,
+        "pages_reused": len(reused_pages),
+    }
+    _register_document(
+        doc_id, file_hash, source, page_count, chunk_ids,
+        lineage_id=lineage_id, page_chunks=page_chunks,
+    )
+    if previous is not None:
+        _detach_document(thread_id, previous["doc_id"])
+        if previous["incremental"]:
+            # Its surviving chunks now belong to the new version.
+            _supersede_document(previous["doc_id"], doc_id)
+    _attach_document(thread_id, doc_id, source)
+    _attach_retriever(thread_id, summary)
+
+    return summary
+
+
+# Background ingestion: uploads are written to disk and recorded in the
+# ingest_jobs table, then indexed by a small worker pool. Jobs that were queued
+# or running when the process stopped are picked up again on the next start.
+INGEST_WORKERS = 2
+INGEST_UPLOAD_DIR = './ingest_uploads'
+_INGEST_EXECUTOR = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_ACTIVE_JOB_STATES = ("pending", "running")
+
+
+def _update_job(job_id: str, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    with _REGISTRY_LOCK:
+        registry_conn.execute(
+            f"UPDATE ingest_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id)
         )
-        chunks = splitter.split_documents(docs)
+        registry_conn.commit()
+
+
+def _run_ingest_job(job_id: str):
+    with _REGISTRY_LOCK:
+        row = registry_conn.execute(
+            "SELECT thread_id, filename, upload_path FROM ingest_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    if row is None:
+        return
+    thread_id, filename, upload_path = row
+    _update_job(job_id, status="running")
+
+    def report_progress(done: int, total: Optional[int]):
+        _update_job(job_id, pages_done=done, pages_total=total)
 
-        vector_store.from_documents(
-            documents=chunks,
-            embedding=embedding_model,
-            persist_directory='./chroma_db',
-            collection_name='my_documents',
+    try:
+        with open(upload_path, "rb") as upload:
+            file_bytes = upload.read()
+        summary = ingest_pdf(file_bytes, thread_id, filename, progress_callback=report_progress)
+    except Exception as exc:
+        _update_job(job_id, status="failed", error=str(exc))
+    else:
+        _update_job(
+            job_id, status="done", summary=json.dumps(summary),
+            pages_done=summary["documents"], pages_total=summary["documents"],
         )
-        retriever = vector_store.as_retriever(
-            search_type="similarity", search_kwargs={"k": 4}
+    # Failed jobs are not resumed, so their upload is no longer needed either.
+    try:
+        os.remove(upload_path)
+    except OSError:
+        pass
+
+
+def enqueue_pdf(file_bytes: bytes, thread_id: str, filename: Optional[str] = None) -> str:
+    """
+    Queue the PDF for background indexing and return its job id.
+
+    Uploading the same bytes to the same thread again returns the existing job
+    instead of queueing a second one, as long as that job is still the
+    latest for the file or its document is still attached to the thread.
+    Re-uploading an older version after a newer one replaced it is queued.
+    """
+    if not file_bytes:
+        raise ValueError("No bytes received for ingestion.")
+
+    thread_id = str(thread_id)
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    with _REGISTRY_LOCK:
+        row = registry_conn.execute(
+            "SELECT job_id FROM ingest_jobs j WHERE thread_id = ? AND file_hash = ? AND status IN (?, ?) "
+            "AND NOT EXISTS (SELECT 1 FROM ingest_jobs later WHERE later.thread_id = j.thread_id "
+            "AND later.filename IS j.filename AND later.created_at > j.created_at) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (thread_id, file_hash, *_ACTIVE_JOB_STATES),
+        ).fetchone()
+        if row is None:
+            row = registry_conn.execute(
+                "SELECT job_id FROM ingest_jobs j WHERE thread_id = ? AND file_hash = ? AND status = 'done' "
+                "AND EXISTS (SELECT 1 FROM thread_documents t JOIN documents d ON d.doc_id = t.doc_id "
+                "WHERE t.thread_id = j.thread_id AND d.file_hash = j.file_hash AND d.superseded_by IS NULL) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (thread_id, file_hash),
+            ).fetchone()
+    if row is not None:
+        return row[0]
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(INGEST_UPLOAD_DIR, exist_ok=True)
+    upload_path = os.path.join(INGEST_UPLOAD_DIR, f"{job_id}.pdf")
+    with open(upload_path, "wb") as upload:
+        upload.write(file_bytes)
+
+    now = time.time()
+    with _REGISTRY_LOCK:
+        registry_conn.execute(
+            "INSERT INTO ingest_jobs (job_id, thread_id, filename, file_hash, upload_path, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+            (job_id, thread_id, filename, file_hash, upload_path, now, now),
         )
+        registry_conn.commit()
+    _INGEST_EXECUTOR.submit(_run_ingest_job, job_id)
+    return job_id
 
-        _THREAD_RETRIEVERS[str(thread_id)] = retriever
-        _THREAD_METADATA[str(thread_id)] = {
-            "filename": filename or os.path.basename(temp_path),
-            "documents": len(docs),
-            "chunks": len(chunks),
-        }
 
-        return {
-            "filename": filename or os.path.basename(temp_path),
-            "documents": len(docs),
-            "chunks": len(chunks),
+def ingestion_jobs(thread_id: str) -> list[dict]:
+    """Jobs for the thread, oldest first, with their progress."""
+    with _REGISTRY_LOCK:
+        rows = registry_conn.execute(
+            "SELECT job_id, filename, status, pages_done, pages_total, summary, error "
+            "FROM ingest_jobs WHERE thread_id = ? ORDER BY created_at",
+            (str(thread_id),),
+        ).fetchall()
+    return [
+        {
+            "job_id": job_id,
+            "filename": filename,
+            "status": status,
+            "pages_done": pages_done,
+            "pages_total": pages_total,
+            "summary": json.loads(summary) if summary else None,
+            "error": error,
         }
-    finally:
-        try:
-            os.remove(temp_path)
-        except OSError:
-            pass
+        for job_id, filename, status, pages_done, pages_total, summary, error in rows
+    ]
+
+
+def _resume_ingest_jobs():
+    with _REGISTRY_LOCK:
+        rows = registry_conn.execute(
+            "SELECT job_id FROM ingest_jobs WHERE status IN (?, ?) ORDER BY created_at",
+            _ACTIVE_JOB_STATES,
+        ).fetchall()
+    for (job_id,) in rows:
+        _update_job(job_id, status="pending")
+        _INGEST_EXECUTOR.submit(_run_ingest_job, job_id)
+
+
+_resume_ingest_jobs()
 
 
 search_tool = DuckDuckGoSearchRun(region="us")
@@ -126,12 +877,21 @@ def search_docs(query: str) -> str:
     Returns:
         str: The search results.
     """
-    results = vector_store.similarity_search(query, k=3)
-    return "\n\n".join([doc.page_content for doc in results])
+    results = retrieval_cache.get_or_compute(
+        None, query, SEARCH_DOCS_RETRIEVAL["k"], _retrieval_key(SEARCH_DOCS_RETRIEVAL),
+        lambda: HybridRetriever(vector_store=vector_store, bm25=bm25_index, **SEARCH_DOCS_RETRIEVAL).invoke(query),
+    )
+    packed = pack_context(results, max_tokens=RAG_CONTEXT_TOKENS)
+    return "\n\n".join([doc.page_content for doc in packed])
 
 
-@tool
-def rag_tool(query: str, thread_id: Optional[str] = None) -> dict:
+# Bookkeeping the app needs from a retrieval but the model does not; it goes
+# in the ToolMessage artifact instead of costing prompt tokens.
+_ARTIFACT_METADATA_KEYS = ("doc_id", "chunk_ids")
+
+
+@tool(response_format="content_and_artifact")
+def rag_tool(query: str, thread_id: Optional[str] = None) -> tuple[dict, Optional[dict]]:
     """
     Retrieve relevant documents for the given query using the thread's retriever.
     Args:
@@ -145,17 +905,26 @@ def rag_tool(query: str, thread_id: Optional[str] = None) -> dict:
         return {
             "error": "No document indexed for this chat. Upload a PDF first.",
             "query": query,
-        }
+        }, None
 
-    result = retriever.invoke(query)
-    context = [doc.page_content for doc in result]
-    metadata = [doc.metadata for doc in result]
+    result = retrieval_cache.get_or_compute(
+        str(thread_id), query, retriever.k, _retrieval_key(RAG_RETRIEVAL), lambda: retriever.invoke(query)
+    )
+    packed = pack_context(result, max_tokens=RAG_CONTEXT_TOKENS)
+    context = [doc.page_content for doc in packed]
+    metadata = [
+        {key: value for key, value in doc.metadata.items() if key not in _ARTIFACT_METADATA_KEYS}
+        for doc in packed
+    ]
 
     return {
         "query": query,
         "context": context,
         "metadata": metadata,
-        "source_file": _THREAD_METADATA.get(str(thread_id), {}).get("filename"),
+        "source_file": thread_document_metadata(thread_id).get("filename"),
+    }, {
+        "doc_ids": [doc.metadata.get("doc_id") for doc in packed],
+        "chunk_ids": [chunk_id for doc in packed for chunk_id in doc.metadata.get("chunk_ids", [])],
     }
 
 tools = [search_tool, get_stock_price, search_docs, rag_tool]
@@ -171,20 +940,128 @@ def chatNode(state: ChatbotState) -> ChatbotState:
         "messages": [response]
     }
 
+
+def _cached_answer(thread_id: Optional[str], question: str) -> Optional[str]:
+    """A cached answer for the thread's documents, provided every chunk it was grounded on is still theirs."""
+    doc_ids = [doc_id for doc_id, _ in _thread_documents(str(thread_id))] if thread_id else []
+    if not doc_ids:
+        return None
+    hit = answer_cache.get(doc_ids, question)
+    if hit is None:
+        return None
+    answer, chunk_ids = hit
+    live = vector_store.get_by_ids(chunk_ids)
+    if len(live) != len(set(chunk_ids)) or any(doc.metadata.get("doc_id") not in doc_ids for doc in live):
+        answer_cache.discard(doc_ids, question)
+        return None
+    return answer
+
+
+def _opens_conversation(messages: list, index: int) -> bool:
+    """
+    True when messages[index] is the thread's first question. Only those are
+    cached: a follow-up ("explain more", "what about its termination clause?")
+    means something different without the turns before it.
+    """
+    return not any(isinstance(message, HumanMessage) for message in messages[:index])
+
+
+def answerCacheNode(state: ChatbotState, config: RunnableConfig) -> ChatbotState:
+    question = state['messages'][-1]
+    if (
+        not isinstance(question, HumanMessage)
+        or not isinstance(question.content, str)
+        or not _opens_conversation(state['messages'], len(state['messages']) - 1)
+    ):
+        return {"messages": []}
+    answer = _cached_answer(config["configurable"].get("thread_id"), question.content)
+    if answer is None:
+        return {"messages": []}
+    # Replayed through a chat model so stream_mode="messages" still streams it.
+    return {"messages": [CachedAnswerModel(answer=answer).invoke(state['messages'], config)]}
+
+
+def rememberAnswerNode(state: ChatbotState, config: RunnableConfig) -> ChatbotState:
+    """Cache the turn's answer when it opened the thread and was grounded only on rag_tool results."""
+    messages = state['messages']
+    start = max(index for index, message in enumerate(messages) if isinstance(message, HumanMessage))
+    question, answer = messages[start], messages[-1]
+    tool_messages = [message for message in messages[start + 1:] if isinstance(message, ToolMessage)]
+    thread_id = config["configurable"].get("thread_id")
+    if (
+        not thread_id
+        or not _opens_conversation(messages, start)
+        or not tool_messages
+        or any(message.name != "rag_tool" for message in tool_messages)
+        or not isinstance(question.content, str)
+        or not isinstance(answer, AIMessage)
+        or not isinstance(answer.content, str)
+        or not answer.content
+    ):
+        return {"messages": []}
+
+    chunk_ids = []
+    for message in tool_messages:
+        # rag_tool returns no artifact when it had nothing to retrieve from.
+        if not isinstance(message.artifact, dict):
+            return {"messages": []}
+        chunk_ids.extend(message.artifact.get("chunk_ids", []))
+
+    doc_ids = [doc_id for doc_id, _ in _thread_documents(str(thread_id))]
+    if doc_ids and chunk_ids:
+        answer_cache.put(doc_ids, question.content, answer.content, list(dict.fromkeys(chunk_ids)))
+    return {"messages": []}
+
+
+def _answered_from_cache(state: ChatbotState) -> bool:
+    return isinstance(state['messages'][-1], AIMessage)
+
+
 tool_node = ToolNode(tools)
 
 graph_builder = StateGraph(ChatbotState)
 
+graph_builder.add_node("answer_cache", answerCacheNode)
 graph_builder.add_node("chat_node", chatNode)
 graph_builder.add_node("tools", tool_node)
+graph_builder.add_node("remember_answer", rememberAnswerNode)
 
-graph_builder.add_edge(START, "chat_node")
-graph_builder.add_conditional_edges("chat_node", tools_condition)
+graph_builder.add_edge(START, "answer_cache")
+graph_builder.add_conditional_edges("answer_cache", _answered_from_cache, {True: END, False: "chat_node"})
+graph_builder.add_conditional_edges("chat_node", tools_condition, {"tools": "tools", END: "remember_answer"})
 graph_builder.add_edge("tools", "chat_node")
+graph_builder.add_edge("remember_answer", END)
+
+# Prune old checkpoints in the background so chatbot.db stays proportional to
+# the live conversations: keep the last CHECKPOINT_KEEP_LAST per thread, or every
+# checkpoint younger than CHECKPOINT_MAX_AGE_DAYS when that is set (0 disables
+# the age window). CHECKPOINT_KEEP_LAST=0 turns retention off. It is set up
+# before anything else opens chatbot.db, so a new database gets incremental
+# auto_vacuum before its first table exists.
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("CHECKPOINT_MAX_AGE_DAYS", "0"))
+CHECKPOINT_RETENTION_INTERVAL = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "300"))
+
+checkpoint_retention = CheckpointRetention(
+    'chatbot.db',
+    keep_last=CHECKPOINT_KEEP_LAST,
+    max_age_seconds=CHECKPOINT_MAX_AGE_DAYS * 86400 or None,
+    interval_seconds=CHECKPOINT_RETENTION_INTERVAL,
+)
+if CHECKPOINT_KEEP_LAST > 0:
+    checkpoint_retention.start()
 
 conn = sqlite3.connect('chatbot.db', check_same_thread=False)
 
-checkPointer = SqliteSaver(conn=conn)
+# Checkpoint and pending-write blobs are compressed with CHECKPOINT_COMPRESSION
+# ("zlib", "zstd" or "none"); rows written before stay readable either way.
+# CheckpointCompression.py trains a dictionary and recompresses existing rows.
+CHECKPOINT_COMPRESSION = os.getenv("CHECKPOINT_COMPRESSION", "zlib")
+checkpoint_serde = CompressedSerializer(
+    None if CHECKPOINT_COMPRESSION == "none" else CHECKPOINT_COMPRESSION, path='chatbot.db'
+)
+
+checkPointer = RegisteredSqliteSaver(conn=conn, serde=checkpoint_serde)
 
 graph = graph_builder.compile(checkpointer=checkPointer)
 
@@ -197,15 +1074,47 @@ graph = graph_builder.compile(checkpointer=checkPointer)
 #         print(message_chunk.content, end='', flush=True)
 
 def listThreads():
-    allthreads = set()
-    for checkPoint in checkPointer.list(None):
-        allthreads.add(checkPoint.config['configurable']['thread_id'])
+    return checkPointer.list_threads()
 
-    return list(allthreads)
+
+def listThreadsPage(limit=20, cursor=None, search=None):
+    """One page of threads, most recently active first, and the cursor of the next page."""
+    return checkPointer.threads_page(limit=limit, cursor=cursor, search=search)
 
 def thread_has_document(thread_id: str) -> bool:
-    return str(thread_id) in _THREAD_RETRIEVERS
+    return _load_thread(thread_id)
+
+
+def thread_document_state(thread_id: str) -> str:
+    """
+    "ready" when every upload is searchable, "partial" when some documents are
+    searchable while others are still indexing, "pending" when nothing is
+    searchable yet but indexing is under way, and "none" otherwise.
+    """
+    with _REGISTRY_LOCK:
+        active = registry_conn.execute(
+            "SELECT COUNT(*) FROM ingest_jobs WHERE thread_id = ? AND status IN (?, ?)",
+            (str(thread_id), *_ACTIVE_JOB_STATES),
+        ).fetchone()[0]
+    searchable = _load_thread(thread_id)
+    if active:
+        return "partial" if searchable else "pending"
+    return "ready" if searchable else "none"
 
 
 def thread_document_metadata(thread_id: str) -> dict:
+    if not _load_thread(thread_id):
+        return {}
     return _THREAD_METADATA.get(str(thread_id), {})
+
+
+def embedding_cache_stats() -> dict:
+    return embedding_model.stats()
+
+
+def retrieval_cache_stats() -> dict:
+    return retrieval_cache.stats()
+
+
+def answer_cache_stats() -> dict:
+    return answer_cache.stats()
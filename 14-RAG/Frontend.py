@@ -3,7 +3,17 @@ import uuid
 import streamlit as st
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
-from Backend import graph as chatbot, listThreads, thread_document_metadata, ingest_pdf
+from Backend import (
+    graph as chatbot,
+    listThreadsPage,
+    thread_document_metadata,
+    thread_document_state,
+    enqueue_pdf,
+    ingestion_jobs,
+)
+
+
+THREADS_PER_PAGE = 20
 
 
 # =========================== Utilities ===========================
@@ -14,15 +24,9 @@ def generate_thread_id():
 def reset_chat():
     thread_id = generate_thread_id()
     st.session_state["thread_id"] = thread_id
-    add_thread(thread_id)
     st.session_state["message_history"] = []
 
 
-def add_thread(thread_id):
-    if thread_id not in st.session_state["chat_threads"]:
-        st.session_state["chat_threads"].append(thread_id)
-
-
 def load_conversation(thread_id):
     state = chatbot.get_state(config={"configurable": {"thread_id": thread_id}})
     return state.values.get("messages", [])
@@ -35,17 +39,15 @@ if "message_history" not in st.session_state:
 if "thread_id" not in st.session_state:
     st.session_state["thread_id"] = generate_thread_id()
 
-if "chat_threads" not in st.session_state:
-    st.session_state["chat_threads"] = listThreads()
-
-if "ingested_docs" not in st.session_state:
-    st.session_state["ingested_docs"] = {}
+if "enqueued_uploads" not in st.session_state:
+    # (thread, uploader file id) -> ingest job id, so each upload is queued once.
+    st.session_state["enqueued_uploads"] = {}
 
-add_thread(st.session_state["thread_id"])
+if "thread_cursors" not in st.session_state:
+    # Cursors of the pages visited so far; the last one is the page on screen.
+    st.session_state["thread_cursors"] = [None]
 
 thread_key = str(st.session_state["thread_id"])
-thread_docs = st.session_state["ingested_docs"].setdefault(thread_key, {})
-threads = st.session_state["chat_threads"][::-1]
 selected_thread = None
 
 # ============================ Sidebar ============================
@@ -56,37 +58,73 @@ if st.sidebar.button("New Chat", use_container_width=True):
     reset_chat()
     st.rerun()
 
-if thread_docs:
-    latest_doc = list(thread_docs.values())[-1]
-    st.sidebar.success(
-        f"Using `{latest_doc.get('filename')}` "
-        f"({latest_doc.get('chunks')} chunks from {latest_doc.get('documents')} pages)"
-    )
-else:
-    st.sidebar.info("No PDF indexed yet.")
+
+@st.fragment(run_every="2s")
+def document_panel(thread_key):
+    """Indexing runs in the backend; this panel polls its progress without blocking the chat."""
+    state = thread_document_state(thread_key)
+    indexed_doc = thread_document_metadata(thread_key)
+    if indexed_doc:
+        st.success(
+            f"Using `{indexed_doc.get('filename')}` "
+            f"({indexed_doc.get('chunks')} chunks from {indexed_doc.get('documents')} pages)"
+        )
+    elif state == "none":
+        st.info("No PDF indexed yet.")
+
+    for job in ingestion_jobs(thread_key):
+        if job["status"] in ("pending", "running"):
+            total = job["pages_total"] or 0
+            done = job["pages_done"] or 0
+            st.progress(
+                done / total if total else 0.0,
+                text=f"Indexing `{job['filename']}` ({done}/{total or '?'} pages)",
+            )
+        elif job["status"] == "failed":
+            st.error(f"Indexing `{job['filename']}` failed: {job['error']}")
+
+
+with st.sidebar:
+    document_panel(thread_key)
 
 uploaded_pdf = st.sidebar.file_uploader("Upload a PDF for this chat", type=["pdf"])
 if uploaded_pdf:
-    if uploaded_pdf.name in thread_docs:
-        st.sidebar.info(f"`{uploaded_pdf.name}` already processed for this chat.")
-    else:
-        with st.sidebar.status("Indexing PDF…", expanded=True) as status_box:
-            summary = ingest_pdf(
-                uploaded_pdf.getvalue(),
-                thread_id=thread_key,
-                filename=uploaded_pdf.name,
-            )
-            thread_docs[uploaded_pdf.name] = summary
-            status_box.update(label="✅ PDF indexed", state="complete", expanded=False)
+    # Every rerun sees the same upload; only a new file (or a new thread) is
+    # hashed and queued. A failed job stays failed in the panel above until
+    # the file is uploaded again.
+    upload_key = (thread_key, uploaded_pdf.file_id)
+    if upload_key not in st.session_state["enqueued_uploads"]:
+        st.session_state["enqueued_uploads"][upload_key] = enqueue_pdf(
+            uploaded_pdf.getvalue(), thread_id=thread_key, filename=uploaded_pdf.name
+        )
 
 st.sidebar.subheader("Past conversations")
+search = st.sidebar.text_input("Search conversations")
+if st.session_state.get("thread_search") != search:
+    st.session_state["thread_search"] = search
+    st.session_state["thread_cursors"] = [None]
+
+# Only the visible page is fetched, so a rerun costs the same however many
+# conversations exist.
+threads, next_cursor = listThreadsPage(THREADS_PER_PAGE, st.session_state["thread_cursors"][-1], search or None)
 if not threads:
     st.sidebar.write("No past conversations yet.")
 else:
-    for thread_id in threads:
-        if st.sidebar.button(str(thread_id), key=f"side-thread-{thread_id}"):
+    for thread in threads:
+        thread_id = thread["thread_id"]
+        if st.sidebar.button(
+            thread_id, key=f"side-thread-{thread_id}", help=f"{thread['message_count'] or 0} messages"
+        ):
             selected_thread = thread_id
 
+newer, older = st.sidebar.columns(2)
+if len(st.session_state["thread_cursors"]) > 1 and newer.button("Newer", use_container_width=True):
+    st.session_state["thread_cursors"].pop()
+    st.rerun()
+if next_cursor and older.button("Older", use_container_width=True):
+    st.session_state["thread_cursors"].append(next_cursor)
+    st.rerun()
+
 # ============================ Main Layout ========================
 st.title("Multi Utility Chatbot")
 
@@ -162,5 +200,4 @@ if selected_thread:
         role = "user" if isinstance(msg, HumanMessage) else "assistant"
         temp_messages.append({"role": role, "content": msg.content})
     st.session_state["message_history"] = temp_messages
-    st.session_state["ingested_docs"].setdefault(str(selected_thread), {})
     st.rerun()
\ No newline at end of file
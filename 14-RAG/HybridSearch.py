@@ -0,0 +1,192 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from typing import Iterable, List, Optional
+from collections import Counter
+from MMR import mmr_select, stored_embeddings
+import math
+import re
+import sqlite3
+import threading
+
+_TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens that keep identifiers like 'XK-200' or '12.3' intact."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Incremental BM25 inverted index persisted in SQLite.
+
+    Postings are stored per (term, chunk_id), so adding a batch of chunks is a
+    handful of inserts and a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, path: str = "bm25_index.db", k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    doc_id TEXT,
+                    length INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks (doc_id);
+                CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id);
+                """
+            )
+
+    def add(self, chunks: Iterable[tuple[str, Document]]):
+        """Index (chunk_id, chunk) pairs; re-adding a chunk replaces its postings."""
+        rows = []
+        postings = []
+        for chunk_id, chunk in chunks:
+            terms = Counter(tokenize(chunk.page_content))
+            rows.append((chunk_id, chunk.metadata.get("doc_id"), sum(terms.values())))
+            postings.extend((term, chunk_id, tf) for term, tf in terms.items())
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM postings WHERE chunk_id = ?", [(row[0],) for row in rows]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, doc_id, length) VALUES (?, ?, ?)", rows
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings
+            )
+            self._conn.commit()
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM postings WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids]
+            )
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids]
+            )
+            self._conn.commit()
+
+    def retag(self, chunk_ids: List[str], doc_id: str):
+        """Move chunks to another document without re-indexing their text."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET doc_id = ? WHERE chunk_id = ?", [(doc_id, chunk_id) for chunk_id in chunk_ids]
+            )
+            self._conn.commit()
+
+    def search(self, query: str, k: int, doc_ids: Optional[List[str]] = None) -> List[tuple[str, float]]:
+        """Return the top-k (chunk_id, score) pairs, optionally restricted to some documents."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM chunks"
+            ).fetchone()
+            if not total:
+                return []
+
+            doc_clause = ""
+            doc_params: list = []
+            if doc_ids:
+                doc_clause = f" AND c.doc_id IN ({','.join('?' * len(doc_ids))})"
+                doc_params = list(doc_ids)
+
+            scores: Counter = Counter()
+            for term in terms:
+                df = self._conn.execute(
+                    "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)
+                ).fetchone()[0]
+                if not df:
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p "
+                    "JOIN chunks c ON c.chunk_id = p.chunk_id "
+                    "WHERE p.term = ?" + doc_clause,
+                    [term, *doc_params],
+                ).fetchall()
+                for chunk_id, tf, length in rows:
+                    norm = self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return scores.most_common(k)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int, rrf_k: int = 60) -> List[tuple[str, float]]:
+    """Fuse several ranked ID lists; each list contributes 1 / (rrf_k + rank). Returns (id, score) pairs."""
+    scores: Counter = Counter()
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (rrf_k + rank)
+    return scores.most_common(k)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense similarity from the vector store fused with BM25 by reciprocal rank fusion.
+
+    With lambda_mult set, the best fetch_k fused chunks are re-ranked by
+    maximal marginal relevance over their stored embeddings, so near-duplicate
+    chunks of one paragraph do not fill all k slots.
+    """
+
+    vector_store: VectorStore
+    bm25: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: Optional[float] = None
+    doc_ids: Optional[List[str]] = None
+
+    def _filter(self) -> Optional[dict]:
+        if not self.doc_ids:
+            return None
+        if len(self.doc_ids) == 1:
+            return {"doc_id": self.doc_ids[0]}
+        return {"doc_id": {"$in": self.doc_ids}}
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = self.vector_store.similarity_search(query, k=self.fetch_k, filter=self._filter())
+        sparse = self.bm25.search(query, self.fetch_k, self.doc_ids)
+
+        by_id = {doc.id: doc for doc in dense if doc.id}
+        fused = reciprocal_rank_fusion(
+            [[doc.id for doc in dense if doc.id], [chunk_id for chunk_id, _ in sparse]],
+            self.k if self.lambda_mult is None else self.fetch_k,
+        )
+
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+        if missing:
+            for doc in self.vector_store.get_by_ids(missing):
+                by_id[doc.id] = doc
+        fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in by_id]
+
+        if self.lambda_mult is not None and len(fused) > self.k:
+            # Relevance is the fused score scaled to [0, 1], so keyword-only
+            # hits keep their rank; diversity comes from the stored vectors.
+            ids = [chunk_id for chunk_id, _ in fused]
+            relevance = [score / fused[0][1] for _, score in fused]
+            picked = mmr_select(relevance, stored_embeddings(self.vector_store, ids), self.k, self.lambda_mult)
+            fused = [fused[index] for index in picked]
+
+        return [by_id[chunk_id] for chunk_id, _ in fused]
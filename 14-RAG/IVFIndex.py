@@ -0,0 +1,204 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index for NumpyVectorStore.
+
+Rows are clustered with spherical k-means; a query only scores the rows in
+its ``nprobe`` nearest clusters. Run this file against a store to see the
+recall/latency trade-off of each nprobe value:
+
+    python IVFIndex.py --store ./numpy_store --k 4
+"""
+import numpy as np
+import json
+import os
+import threading
+import uuid
+from typing import Optional
+
+
+class IVFIndex:
+    """
+    Coarse quantizer over the rows of a NumpyVectorStore.
+
+    Centroids live in ``ivf_centroids.npy`` and the cluster of every row in the
+    append-only ``ivf_assign.i32``, both next to the store's vector file. New
+    rows are assigned to their nearest centroid as they are appended, and the
+    centroids are retrained once the store has grown by ``retrain_growth``
+    since the last training.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        min_train_rows: Optional[int] = None,
+        retrain_growth: float = 2.0,
+        exact_threshold: int = 20_000,
+        seed: int = 0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows or 39 * nlist
+        self.retrain_growth = retrain_growth
+        self.exact_threshold = exact_threshold
+        self.seed = seed
+        self._lock = threading.Lock()
+        # Held for a whole retrain, so concurrent upserts never run k-means twice at once.
+        self._training = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._centroids_path = os.path.join(directory, "ivf_centroids.npy")
+        self._assign_path = os.path.join(directory, "ivf_assign.i32")
+        self._info_path = os.path.join(directory, "ivf.json")
+
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_rows = 0
+        if os.path.exists(self._centroids_path) and os.path.exists(self._info_path):
+            self.centroids = np.load(self._centroids_path)
+            self.assignments = np.fromfile(self._assign_path, dtype=np.int32) if os.path.exists(self._assign_path) else self.assignments
+            with open(self._info_path) as handle:
+                self.trained_rows = json.load(handle)["trained_rows"]
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None, block: int = 65536) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block):
+            labels[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        return labels
+
+    def _kmeans(self, sample: np.ndarray, iterations: int = 20) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist, len(sample))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=nlist)
+            order = np.argsort(labels, kind="stable")
+            present = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts[present])[:-1]])
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        return centroids.astype(np.float32)
+
+    def train(self, matrix: np.ndarray, norms: np.ndarray):
+        """Fit centroids on a sample of the rows, then reassign every row."""
+        rows = matrix.shape[0]
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(rows, 64 * self.nlist)
+        picked = np.sort(rng.choice(rows, sample_size, replace=False))
+        sample = np.asarray(matrix[picked]) / np.maximum(np.asarray(norms[picked])[:, None], 1e-12)
+
+        centroids = self._kmeans(sample.astype(np.float32))
+        assignments = self._assign(matrix, centroids)
+
+        # Assign into a side file and swap it in, so searches keep using the
+        # old centroids until the new ones are complete.
+        staging = f"{self._assign_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            assignments.tofile(staging)
+        except BaseException:
+            os.remove(staging)
+            raise
+
+        with self._lock:
+            # Rows appended during training were assigned to the old
+            # centroids; drop them and retrain on the next upsert.
+            caught_up = len(self.assignments) <= rows
+            os.replace(staging, self._assign_path)
+            self.centroids = centroids
+            self.assignments = assignments
+            self.trained_rows = rows if caught_up else 0
+            np.save(self._centroids_path, centroids)
+            with open(self._info_path, "w") as handle:
+                json.dump({"trained_rows": self.trained_rows, "nlist": len(centroids)}, handle)
+
+    def add(self, vectors: np.ndarray, first_row: int):
+        """Assign freshly appended rows; rows appended before training are covered by train()."""
+        if not self.trained:
+            return
+        with self._lock:
+            if first_row != len(self.assignments):
+                # Out of step with the vector file (e.g. a crash mid-append); the
+                # next retrain rebuilds every assignment.
+                self.trained_rows = 0
+                return
+            labels = self._assign(vectors)
+            self.assignments = np.concatenate([self.assignments, labels])
+            with open(self._assign_path, "ab") as handle:
+                handle.write(labels.tobytes())
+
+    def maybe_retrain(self, matrix: np.ndarray, norms: np.ndarray) -> bool:
+        rows = matrix.shape[0]
+        if rows < self.min_train_rows:
+            return False
+        if not self._training.acquire(blocking=False):
+            # Another upsert is already retraining; its assignments cover these rows.
+            return False
+        try:
+            if self.trained and self.trained_rows and rows < self.trained_rows * self.retrain_growth:
+                return False
+            self.train(matrix, norms)
+            return True
+        finally:
+            self._training.release()
+
+    def candidates(self, query: np.ndarray, total: int, nprobe: Optional[int] = None) -> Optional[np.ndarray]:
+        """Rows in the nprobe clusters closest to the query, or None if the index cannot answer."""
+        if not self.trained or len(self.assignments) < total:
+            return None
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        similarity = self.centroids @ query
+        probe = np.argpartition(-similarity, nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self.assignments[:total], probe))
+
+
+def recall_report(store, k: int = 4, nprobes=(1, 2, 4, 8, 16, 32, 64), queries: int = 200, seed: int = 0):
+    """Print recall@k and latency of IVF search against exact search over the same store."""
+    import time
+
+    matrix, _ = store._mapped()
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(matrix.shape[0], min(queries, matrix.shape[0]), replace=False)
+    probes = [np.asarray(matrix[row]) + rng.normal(0, 0.01, matrix.shape[1]).astype(np.float32) for row in picked]
+
+    exact = [{row for row, _ in store._top_k(query, k, None, exact=True)} for query in probes]
+    print(f"{matrix.shape[0]} rows, {len(probes)} queries, k={k}")
+    for nprobe in nprobes:
+        timings, recalls = [], []
+        for query, truth in zip(probes, exact):
+            started = time.perf_counter()
+            found = {row for row, _ in store._top_k(query, k, None, nprobe=nprobe)}
+            timings.append(time.perf_counter() - started)
+            recalls.append(len(found & truth) / max(len(truth), 1))
+        timings = np.asarray(timings) * 1000
+        print(
+            f"  nprobe={nprobe:<4d} recall@{k}={np.mean(recalls):.3f}  "
+            f"p50={np.percentile(timings, 50):.2f} ms  p95={np.percentile(timings, 95):.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    from NumpyVectorStore import NumpyVectorStore
+    from VectorStoreBenchmark import _UnusedEmbeddings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="./numpy_store")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    index = IVFIndex(args.store, nlist=args.nlist)
+    store = NumpyVectorStore(args.store, _UnusedEmbeddings(), ivf=index)
+    if not index.trained:
+        index.train(*store._mapped())
+    recall_report(store, k=args.k)
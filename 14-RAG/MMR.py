@@ -0,0 +1,56 @@
+from langchain_core.vectorstores import VectorStore
+from typing import List, Sequence
+import numpy as np
+
+
+def mmr_select(relevance: Sequence[float], embeddings: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Indices of k candidates picked by maximal marginal relevance.
+
+    Each step takes the candidate maximising
+    lambda_mult * relevance - (1 - lambda_mult) * max similarity to the picks so far.
+    The pairwise cosine matrix is computed once and the redundancy of every
+    candidate is kept as a running maximum, so a step is a few vector ops.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    count = relevance.shape[0]
+    k = min(k, count)
+    if k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = unit @ unit.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    redundancy = similarity[first].copy()
+    available = np.ones(count, dtype=bool)
+    available[first] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+    return selected
+
+
+def mmr_by_query(query_embedding: Sequence[float], embeddings: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """mmr_select with cosine similarity to the query as the relevance."""
+    query = np.asarray(query_embedding, dtype=np.float32)
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    relevance = (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+    return mmr_select(relevance, vectors, k, lambda_mult)
+
+
+def stored_embeddings(vector_store: VectorStore, ids: Sequence[str]) -> np.ndarray:
+    """Vectors already stored for the ids, in the same order; ids that are gone get a zero vector."""
+    if hasattr(vector_store, "get_embeddings"):
+        return vector_store.get_embeddings(ids)
+    found = vector_store._collection.get(ids=list(ids), include=["embeddings"])
+    by_id = dict(zip(found["ids"], found["embeddings"]))
+    dimension = len(next(iter(by_id.values()))) if by_id else 0
+    return np.asarray(
+        [by_id[chunk_id] if chunk_id in by_id else np.zeros(dimension) for chunk_id in ids], dtype=np.float32
+    )
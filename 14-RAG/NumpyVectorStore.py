@@ -0,0 +1,559 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+import numpy as np
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from IVFIndex import IVFIndex
+from PCAProjection import PCAProjection
+
+
+def _matches(metadata: dict, filter: Optional[dict]) -> bool:
+    """Evaluate the Chroma-style filters used in this project: {key: value} and {key: {"$in": [...]}}."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: vectors ~= codes * scales[:, None]."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store backed by a memory-mapped float32 matrix.
+
+    Rows are only ever appended to ``vectors.f32``; ids, texts and metadata live
+    in a SQLite row table next to it. Updating an id appends a new row and
+    tombstones the old one. Opening the store maps the file without reading
+    it, so startup cost does not depend on the number of chunks.
+
+    A row exists once its SQLite row is committed; vector bytes appended past
+    the last committed row (a crash or SQLite error mid-upsert) are never
+    searched and are truncated on open or before the next append.
+
+    With an IVFIndex attached, large searches only score the rows in the
+    clusters nearest to the query instead of the whole matrix.
+
+    With ``quantize=True`` every row is also stored as int8 codes
+    (``vectors.i8``) with a per-row scale (``scales.f32``). Searches score the
+    int8 rows and rescore only the best ``rescore_factor * k`` of them against
+    the float32 file, so the pages a search keeps resident are a quarter of
+    the size. Run this file against a store for a recall report.
+
+    A PCAProjection does the same with rows projected to fewer dimensions
+    (e.g. 1024 -> 256); when both are configured the projection is used.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Embeddings,
+        dimension: Optional[int] = None,
+        ivf: Optional["IVFIndex"] = None,
+        quantize: bool = False,
+        rescore_factor: int = 8,
+        projection: Optional["PCAProjection"] = None,
+    ):
+        self._embedding = embedding_function
+        self._ivf = ivf
+        self._projection = projection
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+        self._directory = persist_directory
+        os.makedirs(persist_directory, exist_ok=True)
+        self._vectors_path = os.path.join(persist_directory, "vectors.f32")
+        self._norms_path = os.path.join(persist_directory, "norms.f32")
+        self._codes_path = os.path.join(persist_directory, "vectors.i8")
+        self._scales_path = os.path.join(persist_directory, "scales.f32")
+        self._lock = threading.RLock()
+        # Orders index updates by row without holding _lock, so searches are
+        # never queued behind IVF assignment or projection of new rows.
+        self._indexing = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(persist_directory, "rows.db"), check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                doc_id TEXT,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_rows_id ON rows (id, deleted);
+            CREATE INDEX IF NOT EXISTS idx_rows_doc ON rows (doc_id, deleted);
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        stored = self._conn.execute("SELECT value FROM info WHERE key = 'dimension'").fetchone()
+        self._dimension = int(stored[0]) if stored else dimension
+        self._matrix = None
+        self._norms = None
+        self._mapped_rows = -1
+        self._codes = None
+        self._scales = None
+        self._mapped_codes = -1
+        self._deleted = {
+            row for (row,) in self._conn.execute("SELECT row FROM rows WHERE deleted = 1")
+        }
+        # Rows are never removed from the table, so its highest row is the
+        # committed length of every row-aligned file.
+        self._rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+        with self._lock:
+            self._truncate_uncommitted()
+        if quantize:
+            with self._lock:
+                self._sync_quantized()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._dimension
+
+    def __len__(self) -> int:
+        return self._row_count() - len(self._deleted)
+
+    def _row_count(self) -> int:
+        if not self._dimension or not os.path.exists(self._vectors_path):
+            return 0
+        return min(self._rows, os.path.getsize(self._vectors_path) // (4 * self._dimension))
+
+    def _truncate_uncommitted(self):
+        """Cut every row-aligned file back to the committed rows."""
+        if not self._dimension:
+            return
+        for path, width in (
+            (self._vectors_path, 4 * self._dimension),
+            (self._norms_path, 4),
+            (self._codes_path, self._dimension),
+            (self._scales_path, 4),
+        ):
+            if os.path.exists(path) and os.path.getsize(path) > self._rows * width:
+                with open(path, "r+b") as handle:
+                    handle.truncate(self._rows * width)
+        self._mapped_rows = -1
+        self._mapped_codes = -1
+
+    def _mapped(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return (matrix, norms), remapping only when rows were appended since the last call."""
+        rows = self._row_count()
+        if rows and os.path.exists(self._norms_path):
+            rows = min(rows, os.path.getsize(self._norms_path) // 4)
+        if rows != self._mapped_rows:
+            if rows == 0:
+                self._matrix = np.empty((0, self._dimension or 0), dtype=np.float32)
+                self._norms = np.empty(0, dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dimension))
+                self._norms = np.memmap(self._norms_path, dtype=np.float32, mode="r", shape=(rows,))
+            self._mapped_rows = rows
+        return self._matrix, self._norms
+
+    def _quantized_row_count(self) -> int:
+        if not self._dimension or not os.path.exists(self._codes_path) or not os.path.exists(self._scales_path):
+            return 0
+        return min(
+            self._rows, os.path.getsize(self._codes_path) // self._dimension, os.path.getsize(self._scales_path) // 4
+        )
+
+    def _mapped_quantized(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return (codes, scales) for the rows quantized so far."""
+        rows = self._quantized_row_count()
+        if rows != self._mapped_codes:
+            if rows == 0:
+                self._codes = np.empty((0, self._dimension or 0), dtype=np.int8)
+                self._scales = np.empty(0, dtype=np.float32)
+            else:
+                self._codes = np.memmap(self._codes_path, dtype=np.int8, mode="r", shape=(rows, self._dimension))
+                self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(rows,))
+            self._mapped_codes = rows
+        return self._codes, self._scales
+
+    def _sync_quantized(self, block: int = 65536):
+        """Quantize float32 rows that have no int8 copy yet, e.g. after switching quantize on for an existing store."""
+        total = self._row_count()
+        done = self._quantized_row_count()
+        if done == total:
+            return
+        if done > total:
+            done = 0
+        # Drop any torn tail so both files stay row-aligned with vectors.f32.
+        for path, width in ((self._codes_path, self._dimension), (self._scales_path, 4)):
+            with open(path, "ab") as handle:
+                handle.truncate(done * width)
+        matrix, _ = self._mapped()
+        with open(self._codes_path, "ab") as codes_file, open(self._scales_path, "ab") as scales_file:
+            for start in range(done, total, block):
+                codes, scales = quantize_int8(np.asarray(matrix[start:start + block]))
+                codes_file.write(codes.tobytes())
+                scales_file.write(scales.tobytes())
+        self._mapped_codes = -1
+
+    def upsert_embeddings(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[dict]] = None,
+    ) -> List[str]:
+        """Append precomputed vectors, tombstoning any earlier rows with the same ids."""
+        if not ids:
+            return []
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            new_dimension = self._dimension is None
+            if new_dimension:
+                self._dimension = vectors.shape[1]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO info (key, value) VALUES ('dimension', ?)", (str(self._dimension),)
+                )
+            if vectors.shape[1] != self._dimension:
+                raise ValueError(f"Expected {self._dimension}-dim vectors, got {vectors.shape[1]}.")
+
+            self._truncate_uncommitted()
+            first_row = self._rows
+            if self.quantize and self._quantized_row_count() != first_row:
+                self._sync_quantized()
+            tombstoned = []
+            try:
+                tombstoned = self._tombstone(ids)
+                with open(self._vectors_path, "ab") as handle:
+                    handle.write(vectors.tobytes())
+                with open(self._norms_path, "ab") as handle:
+                    handle.write(np.linalg.norm(vectors, axis=1).astype(np.float32).tobytes())
+                if self.quantize:
+                    codes, scales = quantize_int8(vectors)
+                    with open(self._codes_path, "ab") as handle:
+                        handle.write(codes.tobytes())
+                    with open(self._scales_path, "ab") as handle:
+                        handle.write(scales.tobytes())
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, doc_id, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (first_row + offset, chunk_id, metadata.get("doc_id"), text, json.dumps(metadata))
+                        for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                    ],
+                )
+                self._conn.commit()
+            except BaseException:
+                # The rows were never committed, so neither are their vectors.
+                self._conn.rollback()
+                self._deleted.difference_update(tombstoned)
+                self._truncate_uncommitted()
+                if new_dimension:
+                    self._dimension = None
+                raise
+            self._rows = first_row + len(ids)
+            mapped = self._mapped()
+            self._indexing.acquire()
+        try:
+            if self._ivf is not None:
+                self._ivf.add(vectors, first_row)
+            if self._projection is not None:
+                self._projection.add(vectors, first_row)
+        finally:
+            self._indexing.release()
+        # Retraining can take a while on a large store; searches keep using the
+        # old centroids / projection (or exact search) until it finishes.
+        if self._ivf is not None:
+            self._ivf.maybe_retrain(*mapped)
+        if self._projection is not None:
+            self._projection.maybe_refit(*mapped)
+        return list(ids)
+
+    def _tombstone(self, ids: Sequence[str]) -> List[int]:
+        placeholders = ",".join("?" * len(ids))
+        rows = [
+            row for (row,) in self._conn.execute(
+                f"SELECT row FROM rows WHERE deleted = 0 AND id IN ({placeholders})", list(ids)
+            )
+        ]
+        if rows:
+            self._conn.executemany("UPDATE rows SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+            self._deleted.update(rows)
+        return rows
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        return self.upsert_embeddings(ids, self._embedding.embed_documents(texts), texts, metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            self._tombstone(ids)
+            self._conn.commit()
+        return True
+
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[dict]):
+        """Replace the metadata of live rows in place; the vectors are untouched."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE rows SET metadata = ?, doc_id = ? WHERE deleted = 0 AND id = ?",
+                [(json.dumps(metadata), metadata.get("doc_id"), chunk_id) for chunk_id, metadata in zip(ids, metadatas)],
+            )
+            self._conn.commit()
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, metadata FROM rows WHERE deleted = 0 AND id IN ({placeholders})", list(ids)
+            ).fetchall()
+        return [Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)) for chunk_id, text, metadata in rows]
+
+    def get_embeddings(self, ids: Sequence[str]) -> np.ndarray:
+        """Stored float32 vectors for the ids, in the same order; ids that are gone get a zero vector."""
+        if not ids:
+            return np.empty((0, self._dimension or 0), dtype=np.float32)
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            matrix, _ = self._mapped()
+            rows = dict(
+                self._conn.execute(
+                    f"SELECT id, row FROM rows WHERE deleted = 0 AND id IN ({placeholders})", list(ids)
+                ).fetchall()
+            )
+        vectors = np.zeros((len(ids), matrix.shape[1]), dtype=np.float32)
+        for position, chunk_id in enumerate(ids):
+            row = rows.get(chunk_id)
+            if row is not None and row < matrix.shape[0]:
+                vectors[position] = matrix[row]
+        return vectors
+
+    def _candidate_rows(self, filter: Optional[dict], total: int) -> Optional[np.ndarray]:
+        """Row indices allowed by the filter, or None when every live row is a candidate."""
+        if not filter:
+            if not self._deleted:
+                return None
+            mask = np.ones(total, dtype=bool)
+            mask[[row for row in self._deleted if row < total]] = False
+            return np.flatnonzero(mask)
+        if list(filter) == ["doc_id"]:
+            # The thread-scoping filter is answered from the indexed doc_id column.
+            condition = filter["doc_id"]
+            doc_ids = condition["$in"] if isinstance(condition, dict) else [condition]
+            placeholders = ",".join("?" * len(doc_ids))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT row FROM rows WHERE deleted = 0 AND row < ? AND doc_id IN ({placeholders})",
+                    [total, *doc_ids],
+                ).fetchall()
+            return np.asarray([row for (row,) in rows], dtype=np.int64)
+        with self._lock:
+            rows = self._conn.execute("SELECT row, metadata FROM rows WHERE deleted = 0 AND row < ?", (total,)).fetchall()
+        return np.fromiter(
+            (row for row, metadata in rows if _matches(json.loads(metadata), filter)), dtype=np.int64
+        )
+
+    def _top_k(
+        self,
+        embedding: Sequence[float],
+        k: int,
+        filter: Optional[dict],
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+    ) -> List[tuple[int, float]]:
+        with self._lock:
+            matrix, norms = self._mapped()
+            codes, scales = self._mapped_quantized() if self.quantize and not exact else (None, None)
+        if matrix.shape[0] == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+
+        rows = self._candidate_rows(filter, matrix.shape[0])
+        candidate_count = matrix.shape[0] if rows is None else rows.size
+        if self._ivf is not None and not exact and candidate_count > max(self._ivf.exact_threshold, k):
+            probed = self._ivf.candidates(query / query_norm, matrix.shape[0], nprobe)
+            if probed is not None:
+                if rows is not None:
+                    probed = np.intersect1d(rows, probed, assume_unique=True)
+                elif self._deleted:
+                    probed = np.setdiff1d(probed, np.fromiter(self._deleted, dtype=np.int64), assume_unique=True)
+                # Too few hits in the probed clusters: fall back to exact search.
+                if probed.size >= k:
+                    rows = probed
+
+        approximate = None
+        if self._projection is not None and not exact:
+            approximate = self._projection.scorer(query, matrix.shape[0])
+        if approximate is None and codes is not None and codes.shape[0] >= matrix.shape[0]:
+            approximate = lambda picked: (codes[picked].astype(np.float32) @ query) * scales[picked]
+        if approximate is not None:
+            rows = self._shortlist(approximate, norms, rows, matrix.shape[0], k * self.rescore_factor)
+
+        if rows is None:
+            scores = (matrix @ query) / (norms * query_norm + 1e-12)
+            rows = np.arange(matrix.shape[0])
+        else:
+            if rows.size == 0:
+                return []
+            scores = (matrix[rows] @ query) / (norms[rows] * query_norm + 1e-12)
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[index]), float(scores[index])) for index in top]
+
+    @staticmethod
+    def _shortlist(
+        approximate_dot: Callable[[Any], np.ndarray],
+        norms: np.ndarray,
+        rows: Optional[np.ndarray],
+        total: int,
+        size: int,
+        block: int = 8192,
+    ) -> np.ndarray:
+        """The size rows with the best approximate cosine (int8 codes or projected rows)."""
+        count = total if rows is None else rows.size
+        if count <= size:
+            return np.arange(total) if rows is None else rows
+        approximate = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block):
+            # Contiguous slices when scanning every row, so nothing is copied.
+            picked = slice(start, min(start + block, count)) if rows is None else rows[start:start + block]
+            approximate[start:start + block] = approximate_dot(picked) / (norms[picked] + 1e-12)
+        top = np.argpartition(-approximate, size - 1)[:size]
+        return top if rows is None else rows[top]
+
+    def _documents_for_rows(self, hits: List[tuple[int, float]]) -> List[tuple[Document, float]]:
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        with self._lock:
+            rows = {
+                row: (chunk_id, text, metadata)
+                for row, chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT row, id, text, metadata FROM rows WHERE row IN ({placeholders})",
+                    [row for row, _ in hits],
+                )
+            }
+        results = []
+        for row, score in hits:
+            if row not in rows:
+                continue
+            chunk_id, text, metadata = rows[row]
+            results.append((Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)), score))
+        return results
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[tuple[Document, float]]:
+        hits = self._top_k(embedding, k, filter, nprobe=kwargs.get("nprobe"), exact=kwargs.get("exact", False))
+        return self._documents_for_rows(hits)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are already cosine similarities; map [-1, 1] onto [0, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = "./numpy_store",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(persist_directory=persist_directory, embedding_function=embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+def quantization_report(store, k: int = 4, factors=(1, 2, 4, 8, 16), queries: int = 200, seed: int = 0):
+    """Print recall@k and latency of int8 search (per rescore factor) against exact float32 search."""
+    import time
+
+    with store._lock:
+        store._sync_quantized()
+        matrix, _ = store._mapped()
+        codes, scales = store._mapped_quantized()
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(matrix.shape[0], min(queries, matrix.shape[0]), replace=False)
+    probes = [np.asarray(matrix[row]) + rng.normal(0, 0.01, matrix.shape[1]).astype(np.float32) for row in picked]
+
+    exact = [{row for row, _ in store._top_k(query, k, None, exact=True)} for query in probes]
+    print(f"{matrix.shape[0]} rows, {len(probes)} queries, k={k}")
+    print(f"  float32 vectors: {matrix.nbytes / 2**20:.1f} MiB, int8 codes + scales: {(codes.nbytes + scales.nbytes) / 2**20:.1f} MiB")
+    quantize, rescore_factor = store.quantize, store.rescore_factor
+    store.quantize = True
+    try:
+        for factor in factors:
+            store.rescore_factor = factor
+            timings, recalls = [], []
+            for query, truth in zip(probes, exact):
+                started = time.perf_counter()
+                found = {row for row, _ in store._top_k(query, k, None)}
+                timings.append(time.perf_counter() - started)
+                recalls.append(len(found & truth) / max(len(truth), 1))
+            timings = np.asarray(timings) * 1000
+            print(
+                f"  rescore_factor={factor:<3d} recall@{k}={np.mean(recalls):.3f}  "
+                f"p50={np.percentile(timings, 50):.2f} ms  p95={np.percentile(timings, 95):.2f} ms"
+            )
+    finally:
+        store.quantize, store.rescore_factor = quantize, rescore_factor
+
+
+if __name__ == "__main__":
+    import argparse
+    from VectorStoreBenchmark import _UnusedEmbeddings
+
+    parser = argparse.ArgumentParser(description="Compare int8 quantized search with exact float32 search on a store.")
+    parser.add_argument("--store", default="./numpy_store")
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    quantization_report(NumpyVectorStore(args.store, _UnusedEmbeddings()), k=args.k)
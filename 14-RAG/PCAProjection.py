@@ -0,0 +1,213 @@
+"""
+Learned linear projection of NumpyVectorStore rows to a lower dimension.
+
+The projection is fitted on the collection itself (PCA without centering, i.e.
+the top eigenvectors of the second-moment matrix, which best preserves dot
+products). Searches score the projected rows and rescore the best candidates
+against the full vectors. Run this file against a store to see the recall
+trade-off of each target dimension:
+
+    python PCAProjection.py --store ./numpy_store --dims 128 256 512
+"""
+import numpy as np
+import json
+import os
+import threading
+import uuid
+from typing import Callable, Optional
+
+
+class PCAProjection:
+    """
+    Projection of every store row to ``dimension`` components.
+
+    The components live in ``pca_components.npy`` and the projected rows in the
+    append-only ``pca_projected.f32``, both next to the store's vector file.
+    Rows appended after fitting are projected as they arrive, and the
+    projection is refitted once the store has grown by ``refit_growth`` since
+    the last fit.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dimension: int = 256,
+        min_fit_rows: Optional[int] = None,
+        refit_growth: float = 2.0,
+        seed: int = 0,
+    ):
+        self.dimension = dimension
+        self.min_fit_rows = min_fit_rows or 10 * dimension
+        self.refit_growth = refit_growth
+        self.seed = seed
+        self._lock = threading.Lock()
+        # Held for a whole refit, so concurrent upserts never fit twice at once.
+        self._fitting = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._components_path = os.path.join(directory, "pca_components.npy")
+        self._projected_path = os.path.join(directory, "pca_projected.f32")
+        self._info_path = os.path.join(directory, "pca.json")
+
+        self.components: Optional[np.ndarray] = None
+        self.fitted_rows = 0
+        self.explained_variance = 0.0
+        self._projected = None
+        self._mapped_rows = -1
+        if os.path.exists(self._components_path) and os.path.exists(self._info_path):
+            with open(self._info_path) as handle:
+                info = json.load(handle)
+            if info.get("dimension") == dimension:
+                self.components = np.load(self._components_path)
+                self.fitted_rows = info["fitted_rows"]
+                self.explained_variance = info.get("explained_variance", 0.0)
+
+    @property
+    def fitted(self) -> bool:
+        return self.components is not None
+
+    def _row_count(self) -> int:
+        if not self.fitted or not os.path.exists(self._projected_path):
+            return 0
+        return os.path.getsize(self._projected_path) // (4 * self.dimension)
+
+    def _mapped(self) -> np.ndarray:
+        rows = self._row_count()
+        if rows != self._mapped_rows:
+            if rows == 0:
+                self._projected = np.empty((0, self.dimension), dtype=np.float32)
+            else:
+                self._projected = np.memmap(self._projected_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+            self._mapped_rows = rows
+        return self._projected
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        return (np.asarray(vectors, dtype=np.float32) @ self.components.T).astype(np.float32)
+
+    def fit(self, matrix: np.ndarray, norms: np.ndarray, block: int = 65536):
+        """Fit the components on a sample of the rows, then project every row."""
+        rows = matrix.shape[0]
+        rng = np.random.default_rng(self.seed)
+        picked = np.sort(rng.choice(rows, min(rows, 65536), replace=False))
+        sample = np.asarray(matrix[picked]) / np.maximum(np.asarray(norms[picked])[:, None], 1e-12)
+        moments = (sample.T @ sample) / len(sample)
+        eigenvalues, eigenvectors = np.linalg.eigh(moments.astype(np.float64))
+        order = np.argsort(eigenvalues)[::-1][: self.dimension]
+        components = eigenvectors[:, order].T.astype(np.float32)
+        explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+
+        # Project into a side file and swap it in, so searches keep using the
+        # old projection until the new one is complete.
+        staging = f"{self._projected_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(staging, "wb") as handle:
+                for start in range(0, rows, block):
+                    handle.write((np.asarray(matrix[start:start + block]) @ components.T).astype(np.float32).tobytes())
+        except BaseException:
+            os.remove(staging)
+            raise
+
+        with self._lock:
+            os.replace(staging, self._projected_path)
+            self.components = components
+            self.fitted_rows = rows
+            self.explained_variance = explained
+            self._mapped_rows = -1
+            np.save(self._components_path, components)
+            with open(self._info_path, "w") as handle:
+                json.dump(
+                    {"fitted_rows": rows, "dimension": self.dimension, "explained_variance": explained}, handle
+                )
+
+    def add(self, vectors: np.ndarray, first_row: int):
+        """Project freshly appended rows; rows appended before fitting are covered by fit()."""
+        if not self.fitted:
+            return
+        with self._lock:
+            if first_row != self._row_count():
+                # Out of step with the vector file (e.g. rows appended during a
+                # refit); the next refit rebuilds every projected row.
+                self.fitted_rows = 0
+                return
+            with open(self._projected_path, "ab") as handle:
+                handle.write(self.project(vectors).tobytes())
+
+    def maybe_refit(self, matrix: np.ndarray, norms: np.ndarray) -> bool:
+        rows = matrix.shape[0]
+        if rows < self.min_fit_rows:
+            return False
+        if not self._fitting.acquire(blocking=False):
+            # Another upsert is already refitting; its projection covers these rows.
+            return False
+        try:
+            if self.fitted and self.fitted_rows and rows < self.fitted_rows * self.refit_growth:
+                return False
+            self.fit(matrix, norms)
+            return True
+        finally:
+            self._fitting.release()
+
+    def scorer(self, query: np.ndarray, total: int) -> Optional[Callable[[np.ndarray], np.ndarray]]:
+        """Approximate dot products with the query for given rows, or None if the projection cannot answer."""
+        with self._lock:
+            if not self.fitted:
+                return None
+            projected = self._mapped()
+            components = self.components
+        if projected.shape[0] < total:
+            return None
+        projected_query = components @ np.asarray(query, dtype=np.float32)
+        return lambda rows: projected[rows] @ projected_query
+
+
+def recall_report(store, k: int = 4, factors=(1, 2, 4, 8, 16), queries: int = 200, seed: int = 0):
+    """Print recall@k and latency of projected search (per rescore factor) against exact search."""
+    import time
+
+    matrix, _ = store._mapped()
+    projection = store._projection
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(matrix.shape[0], min(queries, matrix.shape[0]), replace=False)
+    probes = [np.asarray(matrix[row]) + rng.normal(0, 0.01, matrix.shape[1]).astype(np.float32) for row in picked]
+
+    exact = [{row for row, _ in store._top_k(query, k, None, exact=True)} for query in probes]
+    print(
+        f"{matrix.shape[0]} rows, {len(probes)} queries, k={k}, {matrix.shape[1]} -> {projection.dimension} dims "
+        f"({projection.explained_variance:.1%} of the energy kept)"
+    )
+    rescore_factor = store.rescore_factor
+    try:
+        for factor in factors:
+            store.rescore_factor = factor
+            timings, recalls = [], []
+            for query, truth in zip(probes, exact):
+                started = time.perf_counter()
+                found = {row for row, _ in store._top_k(query, k, None)}
+                timings.append(time.perf_counter() - started)
+                recalls.append(len(found & truth) / max(len(truth), 1))
+            timings = np.asarray(timings) * 1000
+            print(
+                f"  rescore_factor={factor:<3d} recall@{k}={np.mean(recalls):.3f}  "
+                f"p50={np.percentile(timings, 50):.2f} ms  p95={np.percentile(timings, 95):.2f} ms"
+            )
+    finally:
+        store.rescore_factor = rescore_factor
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from NumpyVectorStore import NumpyVectorStore
+    from VectorStoreBenchmark import _UnusedEmbeddings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="./numpy_store")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256])
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    for dimension in args.dims:
+        # Fit into a scratch directory so the report never touches the live projection.
+        scratch = PCAProjection(tempfile.mkdtemp(prefix="pca-report-"), dimension=dimension)
+        store = NumpyVectorStore(args.store, _UnusedEmbeddings(), projection=scratch)
+        scratch.fit(*store._mapped())
+        recall_report(store, k=args.k)
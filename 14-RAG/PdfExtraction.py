@@ -0,0 +1,98 @@
+"""
+Page extraction and splitting that can run in worker processes.
+
+Kept free of the app's models, databases and executors so that a spawned
+worker importing it starts quickly and does not duplicate any of that state.
+"""
+from collections import deque
+from concurrent.futures import Executor
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from pypdf import PdfReader
+from typing import Iterator, List, Optional, Sequence
+import os
+import tempfile
+
+
+def page_document(reader: PdfReader, index: int, source: str) -> Document:
+    return Document(
+        page_content=reader.pages[index].extract_text() or "",
+        metadata={"source": source, "page": index, "total_pages": len(reader.pages)},
+    )
+
+
+# Splitter options that are not settings but still shape the chunks (here,
+# their start_index metadata); part of the document dedup key.
+SPLITTER_OPTIONS = {"add_start_index": True}
+
+
+def make_splitter(chunk_size: int, chunk_overlap: int, separators: Sequence[str]) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=list(separators),
+        **SPLITTER_OPTIONS,
+    )
+
+
+def extract_shard(
+    path: str, start: int, stop: int, source: str, chunk_size: int, chunk_overlap: int, separators: Sequence[str]
+) -> List[tuple[Document, List[Document]]]:
+    """Extract pages [start, stop) and split each one; runs inside a worker process."""
+    reader = PdfReader(path)
+    splitter = make_splitter(chunk_size, chunk_overlap, separators)
+    shard = []
+    for index in range(start, stop):
+        page = page_document(reader, index, source)
+        shard.append((page, splitter.split_documents([page])))
+    return shard
+
+
+def iter_split_pages(
+    executor: Executor,
+    file_bytes: bytes,
+    source: str,
+    page_count: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: Sequence[str],
+    shards: int,
+    in_flight: int,
+    directory: Optional[str] = None,
+) -> Iterator[tuple[Document, List[Document]]]:
+    """
+    Yield (page, chunks) for every page, in page order, extracted on executor.
+
+    The pages are cut into contiguous shards (more shards than workers, so a
+    few slow pages do not leave the other workers idle). Every worker reads the
+    PDF from one temporary file instead of receiving its bytes, and results are
+    consumed in shard order, so chunk order and metadata match a serial run.
+    At most ``in_flight`` shards are submitted or waiting to be consumed, so a
+    slow consumer (embedding) holds only that many shards in memory.
+    """
+    handle, path = tempfile.mkstemp(suffix=".pdf", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as pdf:
+            pdf.write(file_bytes)
+        size = max(1, -(-page_count // max(1, shards)))
+        starts = iter(range(0, page_count, size))
+        futures: deque = deque()
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                futures.append(executor.submit(
+                    extract_shard, path, start, min(start + size, page_count), source,
+                    chunk_size, chunk_overlap, separators,
+                ))
+
+        for _ in range(max(1, in_flight)):
+            submit_next()
+        try:
+            while futures:
+                shard = futures.popleft().result()
+                submit_next()
+                yield from shard
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        os.remove(path)
@@ -0,0 +1,246 @@
+"""
+Retrieval quality/latency benchmark for the RAG pipeline in Backend.py.
+
+    python RetrievalBenchmark.py --chunk-size 500 1000 --chunk-overlap 100 200 \
+        --k 3 4 5 --retriever dense hybrid mmr --store numpy chroma
+
+Every PDF in the corpus (0-Crash/Report.pdf by default, plus --pdf/--corpus)
+is split with the same splitter as ingest_pdf and embedded with a
+deterministic hashing embedding, so runs are repeatable offline and the
+numbers only move when the configuration does. For every combination it
+reports ingest throughput, p50/p95/p99 retrieval latency, index size on disk,
+resident memory growth and recall@k over the labelled queries in
+benchmark_queries.json (a query is labelled with the pages that answer it).
+"""
+from HybridSearch import BM25Index, HybridRetriever, tokenize
+from NumpyVectorStore import NumpyVectorStore
+from PdfExtraction import make_splitter, page_document
+from langchain_core.embeddings import Embeddings
+from pypdf import PdfReader
+from typing import List, Optional
+import numpy as np
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = [os.path.join(HERE, "..", "0-Crash", "Report.pdf")]
+DEFAULT_QUERIES = os.path.join(HERE, "benchmark_queries.json")
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local stand-in for the embedding endpoint.
+
+    Unigrams and bigrams are hashed with a fixed digest into signed buckets and
+    weighted by log term frequency, so texts sharing words land close together.
+    It is not a semantic model; it makes configurations comparable, not scores
+    absolute.
+    """
+
+    def __init__(self, dimension: int = 1024):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = tokenize(text)
+        counts: dict = {}
+        for feature in itertools.chain(tokens, (f"{a} {b}" for a, b in zip(tokens, tokens[1:]))):
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimension] += (1.0 if digest >> 63 else -1.0) * (1.0 + np.log(count))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _resident_bytes() -> Optional[int]:
+    """Current RSS from /proc (Linux only)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _disk_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+    )
+
+
+def _load_pages(paths: List[str]):
+    pages = []
+    for path in paths:
+        reader = PdfReader(path)
+        source = os.path.basename(path)
+        pages.extend(page_document(reader, index, source) for index in range(len(reader.pages)))
+    return pages
+
+
+def _build_index(directory, store_type, pages, embeddings, chunk_size, chunk_overlap, batch=64):
+    splitter = make_splitter(chunk_size, chunk_overlap, SEPARATORS)
+    chunks = []
+    for page in pages:
+        for index, chunk in enumerate(splitter.split_documents([page])):
+            chunk.id = f"{chunk.metadata['source']}:{chunk.metadata['page']}:{index}"
+            chunk.metadata["doc_id"] = chunk.metadata["source"]
+            chunks.append(chunk)
+
+    if store_type == "chroma":
+        from langchain_chroma import Chroma
+
+        store = Chroma(persist_directory=os.path.join(directory, "chroma"), collection_name="bench", embedding_function=embeddings)
+    else:
+        store = NumpyVectorStore(
+            os.path.join(directory, "numpy"), embeddings, quantize=store_type == "numpy-int8"
+        )
+    bm25 = BM25Index(os.path.join(directory, "bm25.db"))
+
+    for start in range(0, len(chunks), batch):
+        part = chunks[start:start + batch]
+        ids = [chunk.id for chunk in part]
+        vectors = embeddings.embed_documents([chunk.page_content for chunk in part])
+        if isinstance(store, NumpyVectorStore):
+            store.upsert_embeddings(ids, vectors, [chunk.page_content for chunk in part], [chunk.metadata for chunk in part])
+        else:
+            store._collection.upsert(
+                ids=ids, embeddings=vectors,
+                documents=[chunk.page_content for chunk in part], metadatas=[chunk.metadata for chunk in part],
+            )
+        bm25.add(zip(ids, part))
+    return store, bm25, len(chunks)
+
+
+def _retriever(kind: str, store, bm25, k: int, fetch_k: int, lambda_mult: float):
+    if kind == "dense":
+        return lambda query: store.similarity_search(query, k=k)
+    retriever = HybridRetriever(
+        vector_store=store, bm25=bm25, k=k, fetch_k=fetch_k,
+        lambda_mult=lambda_mult if kind == "mmr" else None,
+    )
+    return retriever.invoke
+
+
+def _recall(docs, label) -> float:
+    found = {doc.metadata.get("page") for doc in docs if doc.metadata.get("source") == label["source"]}
+    return len(found & set(label["pages"])) / len(label["pages"])
+
+
+def run(args) -> List[dict]:
+    corpus = list(args.pdf or DEFAULT_CORPUS)
+    for directory in args.corpus or []:
+        corpus.extend(sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(".pdf")))
+    with open(args.queries) as handle:
+        labels = json.load(handle)
+    embeddings = HashingEmbeddings(args.dim)
+
+    started = time.perf_counter()
+    pages = _load_pages(corpus)
+    extract_seconds = time.perf_counter() - started
+
+    results = []
+    for chunk_size, chunk_overlap, store_type in itertools.product(args.chunk_size, args.chunk_overlap, args.store):
+        if chunk_overlap >= chunk_size:
+            continue
+        workdir = tempfile.mkdtemp(prefix="rag-bench-")
+        try:
+            resident_before = _resident_bytes()
+            started = time.perf_counter()
+            store, bm25, chunk_count = _build_index(workdir, store_type, pages, embeddings, chunk_size, chunk_overlap)
+            ingest_seconds = time.perf_counter() - started + extract_seconds
+            disk = _disk_bytes(workdir)
+
+            for kind, k in itertools.product(args.retriever, args.k):
+                search = _retriever(kind, store, bm25, k, args.fetch_k, args.lambda_mult)
+                timings, recalls = [], []
+                for _ in range(args.repeat):
+                    for label in labels:
+                        started = time.perf_counter()
+                        docs = search(label["query"])
+                        timings.append(time.perf_counter() - started)
+                        recalls.append(_recall(docs, label))
+                resident_after = _resident_bytes()
+                timings = np.asarray(timings) * 1000
+                results.append({
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "store": store_type,
+                    "retriever": kind,
+                    "k": k,
+                    "pages": len(pages),
+                    "chunks": chunk_count,
+                    "ingest_pages_per_s": len(pages) / ingest_seconds,
+                    "ingest_chunks_per_s": chunk_count / ingest_seconds,
+                    "p50_ms": float(np.percentile(timings, 50)),
+                    "p95_ms": float(np.percentile(timings, 95)),
+                    "p99_ms": float(np.percentile(timings, 99)),
+                    "disk_bytes": disk,
+                    "resident_growth_bytes": (
+                        resident_after - resident_before if resident_before is not None and resident_after is not None else None
+                    ),
+                    "recall_at_k": float(np.mean(recalls)),
+                })
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _report(results: List[dict]):
+    header = (
+        f"{'size':>5} {'ovl':>4} {'store':<10} {'retriever':<7} {'k':>2} {'chunks':>6} "
+        f"{'pages/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'disk MiB':>8} {'rss MiB':>7} {'recall':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        rss = row["resident_growth_bytes"]
+        print(
+            f"{row['chunk_size']:>5} {row['chunk_overlap']:>4} {row['store']:<10} {row['retriever']:<7} {row['k']:>2} "
+            f"{row['chunks']:>6} {row['ingest_pages_per_s']:>8.1f} {row['p50_ms']:>7.2f} {row['p95_ms']:>7.2f} "
+            f"{row['p99_ms']:>7.2f} {row['disk_bytes'] / 2**20:>8.2f} "
+            f"{(rss / 2**20 if rss is not None else float('nan')):>7.1f} {row['recall_at_k']:>6.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="*", help="PDF files (default: 0-Crash/Report.pdf)")
+    parser.add_argument("--corpus", nargs="*", help="Directories whose PDFs are added to the corpus")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[1000])
+    parser.add_argument("--chunk-overlap", type=int, nargs="+", default=[200])
+    parser.add_argument("--k", type=int, nargs="+", default=[4])
+    parser.add_argument("--retriever", nargs="+", choices=["dense", "hybrid", "mmr"], default=["dense", "hybrid", "mmr"])
+    parser.add_argument("--store", nargs="+", choices=["numpy", "numpy-int8", "chroma"], default=["numpy"])
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the query set for latency percentiles")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    _report(results)
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
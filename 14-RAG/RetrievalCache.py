@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import threading
+import time
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class RetrievalCache:
+    """
+    In-memory LRU + TTL cache for retrieval results.
+
+    Entries are keyed by (scope, query, k, search_type), where scope is a
+    thread_id or None for the whole collection. Every scope has a generation
+    number that is part of the key: invalidate(scope) bumps it, so stale
+    entries can no longer be hit and simply age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, tuple[float, Any]]" = OrderedDict()
+        self._generations: dict = {}
+        self._lock = threading.Lock()
+
+    def _key(self, scope: Optional[Hashable], query: str, k: int, search_type: str) -> tuple:
+        return (scope, self._generations.get(scope, 0), normalize_query(query), k, search_type)
+
+    def get_or_compute(
+        self,
+        scope: Optional[Hashable],
+        query: str,
+        k: int,
+        search_type: str,
+        compute: Callable[[], Any],
+    ) -> Any:
+        with self._lock:
+            key = self._key(scope, query, k, search_type)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            # Only store the result if nothing invalidated the scope meanwhile.
+            if key == self._key(scope, query, k, search_type):
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, scope: Optional[Hashable] = None):
+        """Forget every cached result for the scope (a thread_id, or None for the collection)."""
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,156 @@
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import Checkpoint, CheckpointMetadata, ChannelVersions
+from MessageDeltas import MessageDeltaSaver
+from datetime import datetime
+from typing import Optional
+import time
+
+THREADS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_threads_recency ON threads (updated_at, thread_id);
+"""
+
+UPSERT_THREAD = """
+INSERT INTO threads (thread_id, created_at, updated_at, message_count) VALUES (?, ?, ?, ?)
+ON CONFLICT (thread_id) DO UPDATE SET
+    updated_at = excluded.updated_at,
+    message_count = COALESCE(excluded.message_count, threads.message_count)
+"""
+
+
+def _message_count(checkpoint: Checkpoint) -> Optional[int]:
+    messages = checkpoint.get("channel_values", {}).get("messages")
+    return len(messages) if isinstance(messages, list) else None
+
+
+def _timestamp(checkpoint: Checkpoint) -> float:
+    try:
+        return datetime.fromisoformat(checkpoint["ts"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _page_query(limit: int, cursor: Optional[str], search: Optional[str], match: str) -> tuple[str, list]:
+    """
+    Keyset query for one page of threads, most recently updated first.
+
+    The cursor is the (updated_at, thread_id) of the last row of the previous
+    page, so every page is an index range scan no matter how deep it is.
+    """
+    clauses, params = [], []
+    if cursor:
+        updated_at, thread_id = cursor.split("|", 1)
+        clauses.append("(updated_at, thread_id) < (?, ?)")
+        params += [float(updated_at), thread_id]
+    if search:
+        pattern = _escape_like(search) + "%"
+        clauses.append("thread_id LIKE ? ESCAPE '\\'")
+        params.append(pattern if match == "prefix" else "%" + pattern)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    sql = (
+        "SELECT thread_id, created_at, updated_at, message_count FROM threads "
+        f"{where}ORDER BY updated_at DESC, thread_id DESC LIMIT ?"
+    )
+    return sql, params + [limit + 1]
+
+
+def _page_result(rows: list, limit: int) -> tuple[list[dict], Optional[str]]:
+    threads = [
+        {"thread_id": thread_id, "created_at": created_at, "updated_at": updated_at, "message_count": message_count}
+        for thread_id, created_at, updated_at, message_count in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = threads[-1]
+        next_cursor = f"{last['updated_at']!r}|{last['thread_id']}"
+    return threads, next_cursor
+
+
+class RegisteredSqliteSaver(MessageDeltaSaver):
+    """
+    Checkpoint saver that keeps a ``threads`` table current on every checkpoint write.
+
+    Each row holds thread_id, created_at, updated_at and the message count of
+    the latest root checkpoint, so listing threads is one indexed query instead
+    of deserializing every checkpoint. Databases written before the table
+    existed are backfilled once, from each thread's first and last checkpoint.
+    """
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(THREADS_SCHEMA)
+        if self.conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0] == 0:
+            self._backfill()
+        self.conn.commit()
+
+    def _backfill(self):
+        load = lambda row: self.serde.loads_typed((row[0], row[1]))
+        threads = self.conn.execute(
+            "SELECT thread_id, MIN(checkpoint_id), MAX(checkpoint_id) FROM checkpoints "
+            "WHERE checkpoint_ns = '' GROUP BY thread_id"
+        ).fetchall()
+        for thread_id, first_id, last_id in threads:
+            query = "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?"
+            first = load(self.conn.execute(query, (thread_id, first_id)).fetchone())
+            last = load(self.conn.execute(query, (thread_id, last_id)).fetchone())
+            count = _message_count(last)
+            if count is None:
+                # Delta-encoded checkpoint; setup() runs under the connection lock.
+                found = self._messages(thread_id, "", last_id, cur=self.conn.cursor())
+                count = len(found[0]) if found else None
+            self.conn.execute(UPSERT_THREAD, (thread_id, _timestamp(first), _timestamp(last), count))
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        # Subgraph checkpoints still mark the thread as active, but only the
+        # root namespace holds the conversation's messages.
+        root = not config["configurable"].get("checkpoint_ns")
+        now = time.time()
+        with self.cursor() as cur:
+            cur.execute(
+                UPSERT_THREAD,
+                (str(config["configurable"]["thread_id"]), now, now, _message_count(checkpoint) if root else None),
+            )
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM threads WHERE thread_id = ?", (str(thread_id),))
+
+    def list_threads(self) -> list[str]:
+        """Thread IDs, least recently updated first."""
+        with self.cursor(transaction=False) as cur:
+            cur.execute("SELECT thread_id FROM threads ORDER BY updated_at")
+            return [thread_id for (thread_id,) in cur.fetchall()]
+
+    def threads_page(
+        self, limit: int = 20, cursor: Optional[str] = None, search: Optional[str] = None, match: str = "substring"
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        One page of threads, most recently updated first, plus the cursor of
+        the next page (None on the last one). search filters thread IDs by
+        substring, or by prefix with match="prefix".
+        """
+        sql, params = _page_query(limit, cursor, search, match)
+        with self.cursor(transaction=False) as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        return _page_result(rows, limit)
@@ -0,0 +1,137 @@
+"""
+Compare NumpyVectorStore with Chroma on a synthetic corpus.
+
+    python VectorStoreBenchmark.py --chunks 100000 --dim 1024
+
+Vectors are random but seeded, so runs are repeatable and no embedding
+endpoint is needed. Reported numbers: bulk load time, time to reopen the
+persisted store, query latency (p50/p95) with and without a doc_id filter, and
+how often both stores agree on the top-k.
+"""
+from NumpyVectorStore import NumpyVectorStore
+from langchain_core.embeddings import Embeddings
+import numpy as np
+import argparse
+import shutil
+import tempfile
+import time
+import os
+
+
+class _UnusedEmbeddings(Embeddings):
+    """Queries are issued by vector, so the store never needs to embed text."""
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+def _percentiles(samples: list[float]) -> str:
+    values = np.asarray(samples) * 1000
+    return f"p50={np.percentile(values, 50):.2f} ms  p95={np.percentile(values, 95):.2f} ms"
+
+
+def _corpus(chunks: int, dim: int, docs: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((chunks, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"chunk-{index}" for index in range(chunks)]
+    metadatas = [{"doc_id": f"doc-{index % docs}", "page": index // docs} for index in range(chunks)]
+    queries = rng.standard_normal((200, dim), dtype=np.float32)
+    return vectors, ids, metadatas, queries
+
+
+def bench_numpy(directory, vectors, ids, metadatas, queries, k, batch):
+    started = time.perf_counter()
+    store = NumpyVectorStore(directory, _UnusedEmbeddings())
+    for start in range(0, len(ids), batch):
+        end = start + batch
+        store.upsert_embeddings(ids[start:end], vectors[start:end], ["" for _ in ids[start:end]], metadatas[start:end])
+    load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    store = NumpyVectorStore(directory, _UnusedEmbeddings())
+    reopen = time.perf_counter() - started
+
+    results, flat, filtered = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = store.similarity_search_by_vector(query.tolist(), k=k)
+        flat.append(time.perf_counter() - started)
+        results.append([doc.id for doc in hits])
+
+        started = time.perf_counter()
+        store.similarity_search_by_vector(query.tolist(), k=k, filter={"doc_id": "doc-7"})
+        filtered.append(time.perf_counter() - started)
+    return load, reopen, flat, filtered, results
+
+
+def bench_chroma(directory, vectors, ids, metadatas, queries, k, batch):
+    import chromadb
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=directory)
+    collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, len(ids), batch):
+        end = start + batch
+        collection.upsert(ids=ids[start:end], embeddings=vectors[start:end].tolist(), metadatas=metadatas[start:end])
+    load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=directory)
+    collection = client.get_collection("bench")
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=k)
+    reopen = time.perf_counter() - started
+
+    results, flat, filtered = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = collection.query(query_embeddings=[query.tolist()], n_results=k)
+        flat.append(time.perf_counter() - started)
+        results.append(hits["ids"][0])
+
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=k, where={"doc_id": "doc-7"})
+        filtered.append(time.perf_counter() - started)
+    return load, reopen, flat, filtered, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    vectors, ids, metadatas, queries = _corpus(args.chunks, args.dim, args.docs, args.seed)
+    workdir = tempfile.mkdtemp(prefix="vector-bench-")
+    try:
+        report = {}
+        report["numpy"] = bench_numpy(os.path.join(workdir, "numpy"), vectors, ids, metadatas, queries, args.k, args.batch)
+        if not args.skip_chroma:
+            report["chroma"] = bench_chroma(os.path.join(workdir, "chroma"), vectors, ids, metadatas, queries, args.k, args.batch)
+
+        print(f"{args.chunks} chunks x {args.dim} dims, k={args.k}")
+        for name, (load, reopen, flat, filtered, _) in report.items():
+            print(f"\n[{name}]")
+            print(f"  load:     {load:.2f} s ({args.chunks / load:.0f} chunks/s)")
+            print(f"  reopen:   {reopen * 1000:.1f} ms")
+            print(f"  query:    {_percentiles(flat)}")
+            print(f"  filtered: {_percentiles(filtered)}")
+
+        if "chroma" in report:
+            exact, approximate = report["numpy"][4], report["chroma"][4]
+            overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, approximate)])
+            print(f"\nChroma recall@{args.k} against exact NumPy search: {overlap:.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
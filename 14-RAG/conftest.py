@@ -0,0 +1,71 @@
+import importlib
+import json
+import os
+import sys
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    """Backend.py on the NumPy store, with every database it opens in a fresh directory."""
+    for module in ("langchain_groq", "langchain_huggingface", "langchain_chroma", "langchain_community", "dotenv"):
+        pytest.importorskip(module)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("backend"))
+        patch.setenv("VECTOR_STORE_BACKEND", "numpy")
+        patch.setenv("PDF_EXTRACT_WORKERS", "1")
+        # Nothing is sent to either service; the clients only need a key to construct.
+        patch.setenv("GROQ_API_KEY", os.getenv("GROQ_API_KEY", "test"))
+        patch.setenv("HUGGINGFACEHUB_API_TOKEN", os.getenv("HUGGINGFACEHUB_API_TOKEN", "test"))
+        # Each test module gets its own copy, opened in its own directory.
+        loaded = sys.modules.get("Backend")
+        yield importlib.reload(loaded) if loaded else importlib.import_module("Backend")
+
+
+@pytest.fixture
+def embedded(backend, monkeypatch) -> list:
+    """Texts sent for embedding during the test; vectors come from a local fake."""
+    texts = []
+    fake = DeterministicFakeEmbedding(size=16)
+
+    def embed(batch: list) -> list:
+        texts.extend(batch)
+        return fake.embed_documents(batch)
+
+    monkeypatch.setattr(backend, "_embed_batch", embed)
+    return texts
+
+
+def make_pdf(pages: list) -> bytes:
+    """A minimal PDF with one line of text on each page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return pdf
+
+
+def page_chunks(backend, doc_id: str) -> list:
+    """Chunk IDs of each page of a registered document."""
+    with backend._REGISTRY_LOCK:
+        row = backend.registry_conn.execute("SELECT page_chunks FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+    return [ids for _, ids in json.loads(row[0])]
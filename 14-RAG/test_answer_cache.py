@@ -0,0 +1,100 @@
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from AnswerCache import AnswerCache, CachedAnswerModel
+from conftest import make_pdf, page_chunks
+
+QUESTION = "What was Q3 revenue?"
+
+
+def thread_with_document(backend) -> tuple:
+    """A fresh thread with a one-page PDF attached; returns (config, doc_id, chunk_ids)."""
+    thread_id = uuid.uuid4().hex
+    summary = backend.ingest_pdf(make_pdf([f"{thread_id} revenue was 4.2 billion"]), thread_id, "report.pdf")
+    return {"configurable": {"thread_id": thread_id}}, summary["doc_id"], page_chunks(backend, summary["doc_id"])[0]
+
+
+def test_hit_needs_same_documents_and_question(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answer_cache.db"))
+    cache.put(["doc-a", "doc-b"], "What was Q3 revenue?", "It was $4.2B.", ["doc-a:p1:0"])
+
+    # Document order, case, spacing and trailing punctuation do not matter.
+    assert cache.get(["doc-b", "doc-a"], "  what was q3   revenue ") == ("It was $4.2B.", ["doc-a:p1:0"])
+    # A different question, or a different set of document versions, misses.
+    assert cache.get(["doc-a", "doc-b"], "What was Q4 revenue?") is None
+    assert cache.get(["doc-a"], "What was Q3 revenue?") is None
+    assert cache.get(["doc-a", "doc-c"], "What was Q3 revenue?") is None
+    assert cache.stats() == {"hits": 1, "misses": 3, "hit_rate": 0.25, "entries": 1}
+
+
+def test_entries_expire(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answer_cache.db"), ttl_seconds=0)
+    cache.put(["doc-a"], "question", "answer", [])
+    assert cache.get(["doc-a"], "question") is None
+
+
+def test_discard_and_invalidate(tmp_path):
+    path = str(tmp_path / "answer_cache.db")
+    cache = AnswerCache(path)
+    cache.put(["doc-a"], "first", "answer", [])
+    cache.put(["doc-a", "doc-b"], "second", "answer", [])
+    cache.put(["doc-b"], "third", "answer", [])
+
+    cache.discard(["doc-a"], "first")
+    assert cache.get(["doc-a"], "first") is None
+    cache.invalidate_document("doc-b")
+    assert cache.get(["doc-a", "doc-b"], "second") is None
+    assert cache.get(["doc-b"], "third") is None
+
+    # Entries are persistent across restarts.
+    cache.put(["doc-c"], "fourth", "answer", ["doc-c:p1:0"])
+    assert AnswerCache(path).get(["doc-c"], "fourth") == ("answer", ["doc-c:p1:0"])
+
+
+def test_cached_answer_model_streams_the_answer():
+    model = CachedAnswerModel(answer="Revenue grew 12% year over year.")
+    assert model.invoke([HumanMessage(content="question")]).content == "Revenue grew 12% year over year."
+    pieces = [chunk.content for chunk in model.stream([HumanMessage(content="question")])]
+    assert len(pieces) > 1 and "".join(pieces) == "Revenue grew 12% year over year."
+
+
+def test_opening_question_is_answered_from_cache(backend, embedded):
+    config, doc_id, chunk_ids = thread_with_document(backend)
+    backend.answer_cache.put([doc_id], QUESTION, "It was $4.2B.", chunk_ids)
+
+    reply = backend.answerCacheNode({"messages": [HumanMessage(content=QUESTION)]}, config)
+    assert [message.content for message in reply["messages"]] == ["It was $4.2B."]
+    # A follow-up means something else after the turns before it, so it always misses.
+    follow_up = [HumanMessage(content="Hi"), AIMessage(content="Hello"), HumanMessage(content=QUESTION)]
+    assert backend.answerCacheNode({"messages": follow_up}, config) == {"messages": []}
+
+
+def test_answer_is_dropped_once_its_chunks_are_gone(backend, embedded):
+    config, doc_id, chunk_ids = thread_with_document(backend)
+    backend.answer_cache.put([doc_id], QUESTION, "It was $4.2B.", chunk_ids)
+    backend._delete_chunks(chunk_ids)
+
+    assert backend.answerCacheNode({"messages": [HumanMessage(content=QUESTION)]}, config) == {"messages": []}
+    assert backend.answer_cache.get([doc_id], QUESTION) is None
+
+
+def test_only_answers_grounded_on_rag_tool_are_remembered(backend, embedded):
+    config, doc_id, chunk_ids = thread_with_document(backend)
+
+    def turn(tool: str, artifact) -> list:
+        call = {"name": tool, "args": {"query": "revenue"}, "id": "call-1"}
+        return [
+            HumanMessage(content=QUESTION),
+            AIMessage(content="", tool_calls=[call]),
+            ToolMessage(content="...", name=tool, tool_call_id="call-1", artifact=artifact),
+            AIMessage(content="It was $4.2B."),
+        ]
+
+    backend.rememberAnswerNode({"messages": turn("search_tool", None)}, config)
+    assert backend.answer_cache.get([doc_id], QUESTION) is None
+    backend.rememberAnswerNode({"messages": turn("rag_tool", None)}, config)
+    assert backend.answer_cache.get([doc_id], QUESTION) is None
+
+    backend.rememberAnswerNode({"messages": turn("rag_tool", {"doc_ids": [doc_id], "chunk_ids": chunk_ids})}, config)
+    assert backend.answer_cache.get([doc_id], QUESTION) == ("It was $4.2B.", chunk_ids)
@@ -0,0 +1,84 @@
+import uuid
+
+from conftest import make_pdf, page_chunks
+
+
+def pages(*names: str) -> list:
+    # A tag per test keeps documents from matching ones ingested by other tests.
+    tag = uuid.uuid4().hex[:8]
+    return [f"{tag} page {name} of the annual report" for name in names]
+
+
+def test_identical_upload_reuses_chunks(backend, embedded):
+    pdf = make_pdf(pages("one", "two", "three"))
+    progress = []
+    first = backend.ingest_pdf(pdf, "dedup-1", "report.pdf", progress_callback=lambda done, total: progress.append((done, total)))
+    assert not first["reused"] and first["documents"] == 3
+    assert len(embedded) == first["chunks"] == 3
+    assert progress[-1] == (3, 3)
+    assert [done for done, _ in progress] == sorted(done for done, _ in progress)
+
+    embedded.clear()
+    second = backend.ingest_pdf(pdf, "dedup-2", "copy.pdf")
+    assert second["reused"] and second["doc_id"] == first["doc_id"]
+    assert second["chunks"] == first["chunks"]
+    assert embedded == []
+    assert backend._thread_documents("dedup-2") == [(first["doc_id"], "copy.pdf")]
+
+
+def test_registry_entry_without_chunks_is_reembedded(backend, embedded):
+    pdf = make_pdf(pages("one", "two"))
+    first = backend.ingest_pdf(pdf, "dedup-3", "report.pdf")
+    backend._delete_chunks([chunk_id for ids in page_chunks(backend, first["doc_id"]) for chunk_id in ids])
+
+    embedded.clear()
+    second = backend.ingest_pdf(pdf, "dedup-4", "report.pdf")
+    assert not second["reused"]
+    assert len(embedded) == 2
+
+
+def test_revised_upload_reembeds_only_changed_pages(backend, embedded):
+    one, two, three, revised = pages("one", "two", "three", "two, revised")
+    first = backend.ingest_pdf(make_pdf([one, two, three]), "revise-1", "report.pdf")
+    before = page_chunks(backend, first["doc_id"])
+
+    embedded.clear()
+    second = backend.ingest_pdf(make_pdf([one, revised, three]), "revise-1", "report.pdf")
+    assert not second["reused"] and second["pages_reused"] == 2
+    assert embedded == [revised]
+
+    after = page_chunks(backend, second["doc_id"])
+    assert after[0] == before[0] and after[2] == before[2]
+    assert backend.vector_store.get_by_ids(before[1]) == []
+    kept = backend.vector_store.get_by_ids(after[0] + after[2])
+    assert len(kept) == 2 and all(doc.metadata["doc_id"] == second["doc_id"] for doc in kept)
+    assert backend._was_superseded(first["doc_id"])
+    assert backend._thread_documents("revise-1") == [(second["doc_id"], "report.pdf")]
+
+
+def test_shared_version_is_not_revised_in_place(backend, embedded):
+    one, two, revised = pages("one", "two", "two, revised")
+    first = backend.ingest_pdf(make_pdf([one, two]), "shared-1", "report.pdf")
+    backend.ingest_pdf(make_pdf([one, two]), "shared-2", "report.pdf")
+
+    embedded.clear()
+    second = backend.ingest_pdf(make_pdf([one, revised]), "shared-1", "report.pdf")
+    assert second["pages_reused"] == 0 and len(embedded) == 2
+    # The other thread still searches the original version.
+    before = [chunk_id for ids in page_chunks(backend, first["doc_id"]) for chunk_id in ids]
+    assert len(backend.vector_store.get_by_ids(before)) == len(before)
+    assert not backend._was_superseded(first["doc_id"])
+
+
+def test_reuploading_an_indexed_revision_retires_the_replaced_version(backend, embedded):
+    one, two, revised = pages("one", "two", "two, revised")
+    first = backend.ingest_pdf(make_pdf([one, two]), "reuse-1", "report.pdf")
+    backend.ingest_pdf(make_pdf([one, revised]), "reuse-2", "report.pdf")
+
+    embedded.clear()
+    second = backend.ingest_pdf(make_pdf([one, revised]), "reuse-1", "report.pdf")
+    assert second["reused"] and embedded == []
+    replaced = [chunk_id for ids in page_chunks(backend, first["doc_id"]) for chunk_id in ids]
+    assert backend.vector_store.get_by_ids(replaced) == []
+    assert backend._was_superseded(first["doc_id"])
+    assert backend._thread_documents("reuse-1") == [(second["doc_id"], "report.pdf")]
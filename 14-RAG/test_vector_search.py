@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from IVFIndex import IVFIndex
+from NumpyVectorStore import NumpyVectorStore
+from PCAProjection import PCAProjection
+
+DIMENSION = 32
+ROWS = 2000
+K = 4
+
+
+def clustered(rows: int = ROWS, clusters: int = 20, rank: int = 8, seed: int = 0) -> np.ndarray:
+    """Clusters in a low-rank subspace, like real embeddings, so a projection has something to keep."""
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(rng.normal(size=(DIMENSION, rank)))
+    centers = rng.normal(size=(clusters, rank))
+    latent = centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, rank))
+    return (latent @ basis.T + 0.01 * rng.normal(size=(rows, DIMENSION))).astype(np.float32)
+
+
+def fill(store: NumpyVectorStore, vectors: np.ndarray, first: int = 0, batch: int = 250):
+    for start in range(0, len(vectors), batch):
+        rows = range(first + start, first + min(start + batch, len(vectors)))
+        ids = [f"chunk-{row}" for row in rows]
+        store.upsert_embeddings(ids, vectors[start:start + batch], ids, [{"doc_id": f"doc-{row % 2}"} for row in rows])
+
+
+def make_store(directory, **kwargs) -> NumpyVectorStore:
+    return NumpyVectorStore(str(directory), DeterministicFakeEmbedding(size=DIMENSION), **kwargs)
+
+
+def recall(store: NumpyVectorStore, queries: np.ndarray, **kwargs) -> float:
+    found = 0
+    for query in queries:
+        exact = {doc.id for doc in store.similarity_search_by_vector(query, K, exact=True)}
+        approximate = {doc.id for doc in store.similarity_search_by_vector(query, K, **kwargs)}
+        found += len(exact & approximate)
+    return found / (K * len(queries))
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    return clustered()
+
+
+@pytest.fixture
+def queries(vectors) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    return vectors[rng.choice(len(vectors), 50, replace=False)] + 0.05 * rng.normal(size=(50, DIMENSION)).astype(np.float32)
+
+
+def test_exact_search_finds_the_stored_row(tmp_path, vectors):
+    store = make_store(tmp_path)
+    fill(store, vectors)
+    assert len(store) == ROWS
+    hits = store.similarity_search_by_vector_with_score(vectors[123], K)
+    assert hits[0][0].id == "chunk-123"
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_filters_and_deletes(tmp_path, vectors):
+    store = make_store(tmp_path)
+    fill(store, vectors)
+    store.delete(["chunk-123"])
+    assert "chunk-123" not in {doc.id for doc in store.similarity_search_by_vector(vectors[123], K)}
+    hits = store.similarity_search_by_vector(vectors[124], K, filter={"doc_id": "doc-1"})
+    assert hits and all(doc.metadata["doc_id"] == "doc-1" for doc in hits)
+
+
+def test_uncommitted_tail_is_never_searched(tmp_path, vectors):
+    store = make_store(tmp_path)
+    fill(store, vectors[:500])
+    # Vector bytes written without their SQLite rows, as after a crash mid-upsert.
+    with open(os.path.join(tmp_path, "vectors.f32"), "ab") as handle:
+        handle.write(vectors[500:510].tobytes())
+
+    reopened = make_store(tmp_path)
+    assert len(reopened) == 500
+    assert os.path.getsize(os.path.join(tmp_path, "vectors.f32")) == 500 * DIMENSION * 4
+    fill(reopened, vectors[500:1000], first=500)
+    assert reopened.similarity_search_by_vector(vectors[700], 1)[0].id == "chunk-700"
+
+
+def test_ivf_search(tmp_path, vectors, queries):
+    ivf = IVFIndex(str(tmp_path), nlist=16, nprobe=4, min_train_rows=500, exact_threshold=0)
+    store = make_store(tmp_path, ivf=ivf)
+    fill(store, vectors)
+    assert ivf.trained and len(ivf.assignments) == ROWS
+    probed = ivf.candidates(queries[0] / np.linalg.norm(queries[0]), ROWS)
+    assert probed is not None and 0 < probed.size < ROWS
+
+    assert recall(store, queries) >= 0.9
+    assert recall(store, queries, nprobe=16) == 1.0
+    store.delete(["chunk-123"])
+    assert "chunk-123" not in {doc.id for doc in store.similarity_search_by_vector(vectors[123], K)}
+
+    # The trained index is reloaded from disk rather than retrained.
+    reopened = make_store(tmp_path, ivf=IVFIndex(str(tmp_path), nlist=16, nprobe=4, min_train_rows=500, exact_threshold=0))
+    assert reopened.similarity_search_by_vector(vectors[124], 1)[0].id == "chunk-124"
+
+
+def test_int8_search(tmp_path, vectors, queries):
+    store = make_store(tmp_path, quantize=True, rescore_factor=8)
+    fill(store, vectors)
+    assert os.path.getsize(os.path.join(tmp_path, "vectors.i8")) == ROWS * DIMENSION
+    assert recall(store, queries) >= 0.95
+    assert store.similarity_search_by_vector_with_score(vectors[123], 1)[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_quantization_catches_up_on_existing_store(tmp_path, vectors):
+    fill(make_store(tmp_path), vectors)
+    store = make_store(tmp_path, quantize=True)
+    assert os.path.getsize(os.path.join(tmp_path, "vectors.i8")) == ROWS * DIMENSION
+    assert store.similarity_search_by_vector(vectors[123], 1)[0].id == "chunk-123"
+
+
+def test_pca_search(tmp_path, vectors, queries):
+    projection = PCAProjection(str(tmp_path), dimension=8, min_fit_rows=500)
+    store = make_store(tmp_path, projection=projection, rescore_factor=8)
+    fill(store, vectors)
+    assert projection.fitted and projection.components.shape == (8, DIMENSION)
+    assert projection.scorer(queries[0], ROWS) is not None
+    assert recall(store, queries) >= 0.9
+    # Scores are always rescored against the full-dimension rows.
+    assert store.similarity_search_by_vector_with_score(vectors[123], 1)[0][1] == pytest.approx(1.0, abs=1e-5)